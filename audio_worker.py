@@ -0,0 +1,193 @@
+import atexit
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+class SpeechJob:
+    """One piece of text waiting to be spoken, and what became of it"""
+
+    _ids = itertools.count(1)
+
+    def __init__(self, text, emotion=None, language=None, owner=None, play=True):
+        self.id = next(self._ids)
+        self.text = text
+        self.emotion = emotion
+        self.language = language
+        self.owner = owner
+        self.play = play  # False only prepares the audio, e.g. to warm a cache
+        self.state = "queued"  # queued, speaking, done, cancelled or failed
+        self.error = None
+        self.cancel = threading.Event()
+        self.finished = threading.Event()
+        self.created = time.time()
+
+    def _finish(self, state, error=None):
+        self.state = state
+        self.error = error
+        self.finished.set()
+
+class AudioWorker:
+    """Plays speech jobs one at a time on a background thread
+
+    speak_func(job) synthesizes and plays job.text. It runs on the worker
+    thread only, should raise on failure, and should stop early once
+    job.cancel is set. Jobs are played in submission order, ahead of
+    queued jobs that only prepare audio; each owner (one per browser
+    session) can cancel its own queued and playing jobs.
+
+    setup_func(), if given, runs once on the worker thread before the
+    first job, so that resources used by speak_func (such as a speech
+    engine that must stay on one thread) are created on that thread.
+    """
+
+    def __init__(self, speak_func, name="audio-worker", history=20, setup_func=None):
+        self.speak_func = speak_func
+        self.setup_func = setup_func
+        self.name = name
+        self.ready = threading.Event()  # set once setup_func has run
+        self._queue = deque()
+        self._current = None
+        self._recent = {}  # owner -> deque of that owner's latest jobs
+        self._history = history
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopped = False
+
+    def start(self):
+        """Start the worker thread (and its setup) without submitting a job"""
+        with self._cond:
+            self._ensure_started()
+
+    def submit(self, text, emotion=None, language=None, owner=None, replace=True, play=True):
+        """Queue text to be spoken and return the job immediately
+
+        With replace, the owner's queued and playing jobs are cancelled
+        first, so a new reply interrupts the previous one.
+        """
+        job = SpeechJob(text, emotion, language, owner, play)
+        with self._cond:
+            if replace:
+                self._cancel(owner, queued=True, current=True)
+            self._queue.append(job)
+            self._recent.setdefault(owner, deque(maxlen=self._history)).append(job)
+            self._ensure_started()
+            self._cond.notify()
+        return job
+
+    def cancel(self, owner=None):
+        """Drop the owner's queued jobs and stop the one playing; returns how many were cancelled"""
+        with self._cond:
+            return self._cancel(owner, queued=True, current=True)
+
+    def skip(self, owner=None):
+        """Stop the owner's job that is playing now and go on with the queue"""
+        with self._cond:
+            return self._cancel(owner, queued=False, current=True)
+
+    def status(self, owner=None):
+        """State of the owner's speech for the UI
+
+        Returns a dict with state ("speaking", "queued" or "idle"), the text
+        being spoken, the number of jobs waiting and the error of the most
+        recent failed job, if it is the owner's latest job.
+        """
+        with self._cond:
+            current = self._current if self._current is not None and self._current.owner == owner else None
+            queued = sum(1 for job in self._queue if job.owner == owner)
+            recent = self._recent.get(owner)
+            latest = recent[-1] if recent else None
+            if current is not None:
+                state = "speaking"
+            elif queued:
+                state = "queued"
+            else:
+                state = "idle"
+            return {
+                "state": state,
+                "text": current.text if current is not None else None,
+                "queued": queued,
+                "error": latest.error if latest is not None and latest.state == "failed" else None,
+                "job_id": latest.id if latest is not None else None
+            }
+
+    def busy(self):
+        """Whether anything is being spoken or waiting to be, for any owner"""
+        with self._cond:
+            jobs = list(self._queue) + ([self._current] if self._current is not None else [])
+            return any(job.play for job in jobs)
+
+    def close(self):
+        """Stop the worker after cancelling everything still queued"""
+        with self._cond:
+            self._stopped = True
+            for job in self._queue:
+                job._finish("cancelled")
+            self._queue.clear()
+            if self._current is not None:
+                self._current.cancel.set()
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _cancel(self, owner, queued, current):
+        # Called with self._cond held
+        cancelled = 0
+        if queued:
+            keep = deque()
+            for job in self._queue:
+                if job.owner == owner:
+                    job.cancel.set()
+                    job._finish("cancelled")
+                    cancelled += 1
+                else:
+                    keep.append(job)
+            self._queue = keep
+        if current and self._current is not None and self._current.owner == owner:
+            self._current.cancel.set()
+            cancelled += 1
+        return cancelled
+
+    def _ensure_started(self):
+        # Called with self._cond held
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _run(self):
+        if self.setup_func is not None:
+            try:
+                self.setup_func()
+            except Exception as e:
+                logger.warning("%s: setup failed: %s", self.name, e)
+        self.ready.set()
+        while True:
+            with self._cond:
+                while not self._queue and not self._stopped:
+                    self._cond.wait()
+                if self._stopped:
+                    return
+                job = next((job for job in self._queue if job.play), self._queue[0])
+                self._queue.remove(job)
+                self._current = job
+                job.state = "speaking"
+            try:
+                self.speak_func(job)
+            except Exception as e:
+                if job.cancel.is_set():
+                    # Stopping playback midway may surface as an error
+                    job._finish("cancelled")
+                else:
+                    # Failures of audio prepared in advance are retried when it is played
+                    level = logging.WARNING if job.play else logging.DEBUG
+                    logger.log(level, "%s: speech job %d failed: %s", self.name, job.id, e)
+                    job._finish("failed", str(e))
+            else:
+                job._finish("cancelled" if job.cancel.is_set() else "done")
+            finally:
+                with self._cond:
+                    self._current = None
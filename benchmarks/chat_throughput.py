@@ -0,0 +1,126 @@
+"""End-to-end chat throughput benchmark against the mock LLM server
+
+Starts benchmarks/mock_llm_server.py in-process, points the app at it and
+drives the chat pipeline (prompt building, provider routing, streaming and
+storing the exchange) from N concurrent sessions. Reports latency
+percentiles, time to first token and messages per second:
+
+    python benchmarks/chat_throughput.py
+    python benchmarks/chat_throughput.py --sessions 32 --messages 10 --profile flaky
+    python benchmarks/chat_throughput.py --rate-limited   # keep the configured Groq quota
+
+Data is written to a temporary directory, never to the app's data/.
+"""
+import argparse
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+import mock_llm_server
+
+PROMPTS = [
+    "I feel stressed about my exams",
+    "Naan romba tired-aa irukken",
+    "I had a good day today",
+    "I can't sleep at night",
+    "My friends are ignoring me",
+]
+
+def percentiles(values):
+    """p50, p95 and p99 of a list of numbers"""
+    if len(values) < 2:
+        return (values[0],) * 3 if values else (0.0,) * 3
+    cuts = statistics.quantiles(values, n=100, method="inclusive")
+    return cuts[49], cuts[94], cuts[98]
+
+def run_session(session, messages, use_cache, results, lock):
+    """One simulated user sending `messages` messages in sequence"""
+    import chat_memory
+    import chat_page
+
+    history = []
+    with chat_memory.use_user(f"bench{session}"):
+        for turn in range(messages):
+            # Unique text so the response cache only hits when asked to
+            user_input = f"{PROMPTS[(session + turn) % len(PROMPTS)]} ({session}.{turn})"
+            history.append(("user", user_input))
+
+            first_text = []
+            start = time.perf_counter()
+            reply, provider = chat_page.generate_reply(
+                history,
+                session_key=f"bench{session}",
+                use_cache=use_cache,
+                on_text=lambda text: first_text or first_text.append(time.perf_counter())
+            )
+            chat_memory.append_chat_messages([("user", user_input), ("assistant", reply)])
+            end = time.perf_counter()
+            history.append(("assistant", reply))
+
+            with lock:
+                results.append({
+                    "latency": end - start,
+                    "first_token": (first_text[0] if first_text else end) - start,
+                    "provider": provider
+                })
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=8, help="concurrent chat sessions")
+    parser.add_argument("--messages", type=int, default=5, help="messages sent per session")
+    parser.add_argument("--cache", action="store_true", help="allow response cache hits")
+    parser.add_argument("--rate-limited", action="store_true",
+                        help="keep the configured Groq quota instead of lifting it")
+    mock_llm_server.add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    settings = mock_llm_server.settings_from_args(args)
+    server, base_url = mock_llm_server.start_background(settings)
+
+    # Must be set before the app modules read their configuration
+    os.environ["GROQ_BASE_URL"] = base_url
+    os.environ["GROQ_API_KEY"] = os.environ.get("MIND_MIRROR_BENCH_KEY", "mock-key")
+    os.environ["MIND_MIRROR_HF_API_URL"] = f"{base_url}/models/microsoft/DialoGPT-medium"
+    if not args.rate_limited:
+        os.environ["MIND_MIRROR_GROQ_RPM"] = "1000000"
+        os.environ["MIND_MIRROR_GROQ_TPM"] = "1000000000"
+
+    data_dir = tempfile.mkdtemp(prefix="mind_mirror_bench_")
+    os.chdir(data_dir)
+
+    results = []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_session, args=(session, args.messages, args.cache, results, lock))
+        for session in range(args.sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    server.shutdown()
+
+    latency = percentiles([result["latency"] * 1000 for result in results])
+    first_token = percentiles([result["first_token"] * 1000 for result in results])
+    providers = {}
+    for result in results:
+        providers[result["provider"]] = providers.get(result["provider"], 0) + 1
+
+    print(f"Profile:          {args.profile}, {args.sessions} sessions x {args.messages} messages")
+    print(f"Messages:         {len(results)} in {elapsed:.2f} s = {len(results) / elapsed:.1f} messages/s")
+    print(f"Latency (ms):     p50 {latency[0]:.0f}  p95 {latency[1]:.0f}  p99 {latency[2]:.0f}")
+    print(f"First token (ms): p50 {first_token[0]:.0f}  p95 {first_token[1]:.0f}  p99 {first_token[2]:.0f}")
+    print(f"Replies from:     {', '.join(f'{name} {count}' for name, count in sorted(providers.items()))}")
+    print(f"Mock requests:    {', '.join(f'{name} {count}' for name, count in settings.requests.items())}")
+    print(f"Data written to:  {data_dir}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,214 @@
+"""Local stand-in for the Groq and Hugging Face APIs
+
+Serves the two endpoints Mind Mirror calls, with configurable latency,
+errors and streaming, so the chat pipeline can be measured without network
+access or API quota:
+
+    POST /openai/v1/chat/completions    Groq (OpenAI-compatible), streaming or not
+    POST /models/<name>                 Hugging Face inference
+
+Point the app at it with
+
+    GROQ_BASE_URL=http://127.0.0.1:8765
+    MIND_MIRROR_HF_API_URL=http://127.0.0.1:8765/models/microsoft/DialoGPT-medium
+
+and run it standalone with
+
+    python benchmarks/mock_llm_server.py --profile slow
+    python benchmarks/mock_llm_server.py --first-token-ms 300 --token-ms 15 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Named latency/error profiles; command-line options override single fields
+PROFILES = {
+    "fast": {"first_token_ms": 50, "token_ms": 2, "reply_tokens": 60, "error_rate": 0.0, "hf_latency_ms": 100},
+    "typical": {"first_token_ms": 300, "token_ms": 10, "reply_tokens": 120, "error_rate": 0.0, "hf_latency_ms": 800},
+    "slow": {"first_token_ms": 3000, "token_ms": 40, "reply_tokens": 200, "error_rate": 0.0, "hf_latency_ms": 1500},
+    "flaky": {"first_token_ms": 300, "token_ms": 10, "reply_tokens": 120, "error_rate": 0.2, "hf_latency_ms": 800},
+}
+
+DEFAULT_PORT = 8765
+
+class MockSettings:
+    """Behaviour of the mock endpoints; may be changed while the server runs"""
+
+    def __init__(self, profile="typical", **overrides):
+        values = dict(PROFILES[profile])
+        values.update({key: value for key, value in overrides.items() if value is not None})
+        self.first_token_ms = values["first_token_ms"]
+        self.token_ms = values["token_ms"]
+        self.reply_tokens = values["reply_tokens"]
+        self.error_rate = values["error_rate"]
+        self.hf_latency_ms = values["hf_latency_ms"]
+        self.error_status = values.get("error_status", 429)
+        self.retry_after = values.get("retry_after", 1)
+        self.requests = {"groq": 0, "huggingface": 0, "errors": 0}
+        self._lock = threading.Lock()
+
+    def count(self, name):
+        with self._lock:
+            self.requests[name] += 1
+
+def _reply_tokens(settings):
+    return ["I", " hear", " you", "."] + [" word"] * max(settings.reply_tokens - 4, 0)
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    settings = None  # set by make_server
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _send_json(self, status, body, headers=None):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        if self.path.rstrip("/").endswith("/chat/completions"):
+            self._chat_completion(self._read_json())
+        elif self.path.startswith("/models/"):
+            self._hf_inference(self._read_json())
+        else:
+            self._send_json(404, {"error": {"message": f"No mock for {self.path}"}})
+
+    def _chat_completion(self, request):
+        settings = self.settings
+        settings.count("groq")
+        if random.random() < settings.error_rate:
+            settings.count("errors")
+            self._send_json(
+                settings.error_status,
+                {"error": {"message": "Mock error", "type": "rate_limit_exceeded"}},
+                {"Retry-After": str(settings.retry_after)} if settings.error_status == 429 else None
+            )
+            return
+
+        time.sleep(settings.first_token_ms / 1000)
+        tokens = _reply_tokens(settings)
+        completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+        model = request.get("model", "mock")
+        created = int(time.time())
+
+        if not request.get("stream"):
+            time.sleep(settings.token_ms * len(tokens) / 1000)
+            self._send_json(200, {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": len(tokens), "total_tokens": len(tokens)}
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        try:
+            for position, token in enumerate(tokens + [None]):
+                chunk = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{
+                        "index": 0,
+                        "delta": {"content": token} if token is not None else {},
+                        "finish_reason": None if token is not None else "stop"
+                    }]
+                }
+                self._write_chunk(f"data: {json.dumps(chunk)}\n\n")
+                if token is not None and position:
+                    time.sleep(settings.token_ms / 1000)
+            self._write_chunk("data: [DONE]\n\n")
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            # The client cancelled the stream
+            pass
+
+    def _write_chunk(self, text):
+        data = text.encode("utf-8")
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+    def _hf_inference(self, request):
+        settings = self.settings
+        settings.count("huggingface")
+        time.sleep(settings.hf_latency_ms / 1000)
+        prompt = request.get("inputs", "")
+        self._send_json(200, [{"generated_text": f"{prompt} I am here for you, tell me more."}])
+
+def make_server(settings, host="127.0.0.1", port=DEFAULT_PORT):
+    """Create (but do not start) a mock server; port 0 picks a free port"""
+    handler = type("BoundMockHandler", (MockHandler,), {"settings": settings})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def start_background(settings, host="127.0.0.1", port=0):
+    """Run a mock server on a daemon thread; returns (server, base_url)"""
+    server = make_server(settings, host, port)
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}"
+
+def add_profile_arguments(parser):
+    """Command-line options that shape the mock's behaviour"""
+    parser.add_argument("--profile", choices=sorted(PROFILES), default="typical")
+    parser.add_argument("--first-token-ms", type=float, help="Groq latency before the first token")
+    parser.add_argument("--token-ms", type=float, help="Groq delay between streamed tokens")
+    parser.add_argument("--reply-tokens", type=int, help="tokens per Groq reply")
+    parser.add_argument("--error-rate", type=float, help="share of Groq requests that fail")
+    parser.add_argument("--error-status", type=int, help="HTTP status of failed requests (default 429)")
+    parser.add_argument("--retry-after", type=float, help="Retry-After seconds sent with 429s")
+    parser.add_argument("--hf-latency-ms", type=float, help="Hugging Face response time")
+
+def settings_from_args(args):
+    return MockSettings(
+        args.profile,
+        first_token_ms=args.first_token_ms,
+        token_ms=args.token_ms,
+        reply_tokens=args.reply_tokens,
+        error_rate=args.error_rate,
+        error_status=args.error_status,
+        retry_after=args.retry_after,
+        hf_latency_ms=args.hf_latency_ms
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+
+    server = make_server(settings_from_args(args), args.host, args.port)
+    print(f"Mock LLM server on http://{args.host}:{server.server_address[1]} ({args.profile} profile)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
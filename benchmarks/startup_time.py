@@ -0,0 +1,85 @@
+"""Startup-time budget for Mind Mirror
+
+Imports main.py and each routed page in a fresh interpreter, after
+streamlit itself has been imported, and checks that
+
+- the import time of our own modules stays within the budget, and
+- none of the heavy optional libraries are pulled in just by importing
+  (libraries streamlit already loads itself are not counted).
+
+Exits with status 1 when a budget is exceeded so it can run in CI:
+
+    python benchmarks/startup_time.py
+    python benchmarks/startup_time.py --budget-ms 150 --runs 5
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules imported at startup or when a page is routed to
+MODULES = ["main", "chat_page", "mood_tracker", "journal_page", "progress_page", "voice_analytics"]
+
+# Libraries that must only load when the feature that needs them is used
+HEAVY_MODULES = ["speech_recognition", "pyttsx3", "pydub", "numpy", "gtts", "groq", "httpx", "requests"]
+
+# Import time budget per module, in milliseconds, excluding streamlit itself
+DEFAULT_BUDGET_MS = 100
+
+PROBE = """
+import json, sys, time
+import streamlit
+already_loaded = set(sys.modules)
+start = time.perf_counter()
+import {module}
+elapsed = (time.perf_counter() - start) * 1000
+heavy = [name for name in {heavy!r} if name in sys.modules and name not in already_loaded]
+print(json.dumps({{"ms": elapsed, "heavy": heavy}}))
+"""
+
+def measure(module, runs):
+    """Import a module in fresh interpreters and return (median ms, heavy modules loaded)"""
+    timings = []
+    heavy = []
+    for _ in range(runs):
+        result = subprocess.run(
+            [sys.executable, "-c", PROBE.format(module=module, heavy=HEAVY_MODULES)],
+            cwd=REPO_ROOT, capture_output=True, text=True
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"importing {module} failed:\n{result.stderr}")
+        data = json.loads(result.stdout.strip().splitlines()[-1])
+        timings.append(data["ms"])
+        heavy = data["heavy"]
+    return statistics.median(timings), heavy
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS,
+                        help="maximum median import time per module")
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters per module")
+    args = parser.parse_args()
+
+    failures = []
+    for module in MODULES:
+        ms, heavy = measure(module, args.runs)
+        status = "ok"
+        if ms > args.budget_ms:
+            status = "OVER BUDGET"
+            failures.append(module)
+        if heavy:
+            status = f"loads {', '.join(heavy)}"
+            failures.append(module)
+        print(f"{module:<18} {ms:8.1f} ms  {status}")
+
+    if failures:
+        print(f"\nStartup budget exceeded by: {', '.join(sorted(set(failures)))}")
+        sys.exit(1)
+    print(f"\nAll modules within {args.budget_ms:.0f} ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import os
+import re
+
+# llama3-70b-8192 has an 8192 token window shared by the prompt and the reply.
+# Prompts are kept well below it: every prompt token adds latency and cost.
+MODEL_CONTEXT_TOKENS = 8192
+REPLY_TOKENS = 500
+CONTEXT_TOKEN_BUDGET = min(
+    int(os.getenv("MIND_MIRROR_CONTEXT_TOKENS", 3000)),
+    MODEL_CONTEXT_TOKENS - REPLY_TOKENS
+)
+
+# Upper bound on the rolling summary of older turns
+SUMMARY_MAX_TOKENS = 400
+
+# When older turns are folded into the summary, fold enough that the
+# remaining turns use at most this share of the budget, so the summary is
+# updated every few exchanges rather than on every message
+FOLD_TARGET = 0.5
+
+# Tokens the chat format adds around every message
+MESSAGE_OVERHEAD = 4
+
+_PIECES = re.compile(r"\w+|[^\w\s]")
+
+def count_tokens(text):
+    """Estimate the number of Llama 3 tokens in text
+
+    Counts words and punctuation, but at least one token per 4 bytes of UTF-8
+    so Tamil script (3 bytes per character) is not undercounted. This errs on
+    the high side, which keeps prompts inside the budget.
+    """
+    if not text:
+        return 0
+    return max(len(_PIECES.findall(text)), len(text.encode("utf-8")) // 4)
+
+def message_tokens(content):
+    """Estimated tokens for one chat message"""
+    return count_tokens(content) + MESSAGE_OVERHEAD
+
+def truncate_to_tokens(text, max_tokens):
+    """Cut text (keeping its start) to at most max_tokens"""
+    if count_tokens(text) <= max_tokens:
+        return text
+    lo, hi = 0, len(text)
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if count_tokens(text[:mid]) <= max_tokens:
+            lo = mid
+        else:
+            hi = mid - 1
+    return text[:lo]
+
+def _summary_message(summary):
+    return {"role": "system", "content": f"Summary of the earlier conversation: {summary}"}
+
+def _first_unsummarized(history, offset, summary_state):
+    """Position in history of the first message the summary does not cover
+
+    Never past the newest message, which is always sent, even if a summary
+    claims to cover it.
+    """
+    return min(max(summary_state.get("covered", 0) - offset, 0), max(len(history) - 1, 0))
+
+def _recent_budget(system_prompt, summary_state, budget):
+    used = message_tokens(system_prompt)
+    if summary_state.get("summary"):
+        used += message_tokens(_summary_message(summary_state["summary"])["content"])
+    return budget - used
+
+def build_context(system_prompt, history, offset, summary_state, budget=CONTEXT_TOKEN_BUDGET):
+    """Messages for a completion request within a token budget
+
+    history is the list of (role, message) pairs whose first message has
+    index offset; summary_state is what chat_memory.load_chat_summary returns.
+    The prompt is the system prompt, the summary of older turns, and as many
+    of the newest unsummarized messages as fit. The newest message is always
+    included, truncated if it alone exceeds the budget.
+    """
+    messages = [{"role": "system", "content": system_prompt}]
+    if summary_state.get("summary"):
+        messages.append(_summary_message(summary_state["summary"]))
+
+    remaining = _recent_budget(system_prompt, summary_state, budget)
+    first = _first_unsummarized(history, offset, summary_state)
+
+    recent = []
+    for role, content in reversed(history[first:]):
+        cost = message_tokens(content)
+        if cost > remaining:
+            if not recent:
+                recent.append({"role": role, "content": truncate_to_tokens(content, remaining - MESSAGE_OVERHEAD)})
+            break
+        recent.append({"role": role, "content": content})
+        remaining -= cost
+
+    return messages + list(reversed(recent))
+
+def messages_to_fold(history, offset, summary_state, system_prompt, budget=CONTEXT_TOKEN_BUDGET):
+    """Slice (start, end) of history that should be folded into the summary
+
+    Returns None while the unsummarized messages still fit the budget.
+    """
+    first = _first_unsummarized(history, offset, summary_state)
+    costs = [message_tokens(content) for role, content in history[first:]]
+    recent_budget = _recent_budget(system_prompt, summary_state, budget)
+    if sum(costs) <= recent_budget:
+        return None
+
+    # Fold the oldest messages until the rest fits within FOLD_TARGET of the
+    # budget, always keeping the newest exchange verbatim
+    target = recent_budget * FOLD_TARGET
+    total = sum(costs)
+    end = first
+    while end < len(history) - 2 and total > target:
+        total -= costs[end - first]
+        end += 1
+    return (first, end) if end > first else None
+
+def fold_history(history, offset, summary_state, system_prompt, summarize, budget=CONTEXT_TOKEN_BUDGET):
+    """Fold older messages into the rolling summary when they overflow the budget
+
+    summarize(previous_summary, messages) returns the updated summary text.
+    Returns the new summary state, or None when nothing needed folding.
+    """
+    span = messages_to_fold(history, offset, summary_state, system_prompt, budget)
+    if span is None:
+        return None
+
+    start, end = span
+    summary = summarize(summary_state.get("summary", ""), history[start:end])
+    return {
+        "summary": truncate_to_tokens(summary.strip(), SUMMARY_MAX_TOKENS),
+        "covered": offset + end
+    }
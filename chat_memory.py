@@ -1,145 +1,834 @@
 import json
 import os
+import re
+import shutil
+import hashlib
+import threading
+import uuid
+import logging
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 import streamlit as st
+import sqlite_storage
+import json_cache
+import emotion_series
+from write_behind import WriteBehindQueue, RetryItems
+from config import STORAGE_BACKEND, SQLITE_DB_NAME, ANONYMOUS_USER_MODE, RETENTION_POLICIES, RETENTION_INTERVAL
 
-# File paths for storing data
-CHAT_HISTORY_FILE = "data/chat_history.json"
-EMOTION_DATA_FILE = "data/emotions.json"
-USER_DATA_FILE = "data/user_data.json"
+logger = logging.getLogger(__name__)
 
-# Ensure data directory exists
-os.makedirs("data", exist_ok=True)
+# Every user's data lives in its own directory, data/users/<shard>/<user_id>/,
+# so loads only read that user's files and users never write the same file
+DATA_DIR = "data"
+USERS_DIR = os.path.join(DATA_DIR, "users")
+DEFAULT_USER_ID = "default"
 
-def load_chat_history():
-    """Load chat history from file"""
+# File names inside a user's data directory
+CHAT_HISTORY_FILE = "chat_history.json"  # legacy single-file history, migrated on first use
+CHAT_LOG_DIR = "chat_log"
+EMOTION_DATA_FILE = "emotions.json"  # legacy JSON emotion list, migrated on first use
+EMOTION_SERIES_BASE = "emotions"  # compact series: emotions.ts, emotions.codes, emotions.meta.json
+EMOTION_ROLLUP_FILE = "emotion_rollups.json"
+CHAT_ROLLUP_FILE = "chat_rollups.json"
+CHAT_SUMMARY_FILE = "chat_summary.json"
+CHAT_HISTORY_ID_FILE = "history_id"  # inside CHAT_LOG_DIR
+USER_DATA_FILE = "user_data.json"
+
+# Number of messages per chat log segment before rotating to a new file
+CHAT_SEGMENT_SIZE = 500
+
+# Emotion entries are written in the background, batched per interval or per N entries
+EMOTION_FLUSH_INTERVAL = 2.0
+EMOTION_FLUSH_BATCH = 50
+
+_user_override = threading.local()
+_migration_lock = threading.Lock()
+_global_data_migrated = False
+
+def _clean_user_id(user_id):
+    """Restrict user ids to characters that are safe in a directory name"""
+    if not user_id:
+        return None
+    user_id = re.sub(r'[^A-Za-z0-9_-]', '', str(user_id))[:64]
+    return user_id or None
+
+def resolve_user_id():
+    """Pick the user id for this session and remember it in session state
+
+    Uses the ?user= query parameter when present. Otherwise, by default,
+    a new random id is created and written into the URL, so the browser
+    finds the same history after a reload or from a bookmark. With
+    MIND_MIRROR_ANONYMOUS_USERS=session the id is not kept in the URL, and
+    with "shared" all anonymous sessions share DEFAULT_USER_ID.
+
+    The query parameter is not authenticated; random ids only make other
+    users' histories hard to guess.
+    """
+    if st.session_state.get("user_id"):
+        return st.session_state.user_id
+    
     try:
-        if os.path.exists(CHAT_HISTORY_FILE):
-            with open(CHAT_HISTORY_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('messages', [])
+        user_id = _clean_user_id(st.query_params.get("user"))
+    except Exception:
+        user_id = None
+    
+    if not user_id:
+        if ANONYMOUS_USER_MODE == "shared":
+            user_id = DEFAULT_USER_ID
+        else:
+            user_id = uuid.uuid4().hex
+            if ANONYMOUS_USER_MODE != "session":
+                try:
+                    st.query_params["user"] = user_id
+                except Exception:
+                    logger.warning("Could not keep the user id in the page URL")
+    
+    st.session_state.user_id = user_id
+    return user_id
+
+@contextmanager
+def use_user(user_id):
+    """Run storage calls on this thread against the given user's data"""
+    previous = getattr(_user_override, "user_id", None)
+    _user_override.user_id = user_id
+    try:
+        yield
+    finally:
+        _user_override.user_id = previous
+
+def current_user_id():
+    """User whose data storage calls on this thread operate on"""
+    user_id = getattr(_user_override, "user_id", None)
+    if user_id:
+        return user_id
+    try:
+        user_id = st.session_state.get("user_id")
+    except Exception:
+        # No Streamlit session on this thread (background worker, CLI)
+        user_id = None
+    return user_id or DEFAULT_USER_ID
+
+def user_data_dir(user_id=None):
+    """Directory holding one user's data, sharded by a hash of the id"""
+    user_id = user_id or current_user_id()
+    if user_id == DEFAULT_USER_ID:
+        _migrate_global_data()
+    shard = hashlib.sha1(user_id.encode('utf-8')).hexdigest()[:2]
+    return os.path.join(USERS_DIR, shard, user_id)
+
+def _user_path(name, user_id=None):
+    """Path of a data file inside a user's data directory"""
+    return os.path.join(user_data_dir(user_id), name)
+
+def _sqlite_db():
+    """Path of the current user's SQLite database"""
+    return _user_path(SQLITE_DB_NAME)
+
+def _migrate_global_data():
+    """Move data stored directly in data/ (before per-user directories) to the default user"""
+    global _global_data_migrated
+    if _global_data_migrated:
+        return
+    
+    with _migration_lock:
+        if _global_data_migrated:
+            return
+        
+        names = [
+            CHAT_HISTORY_FILE, CHAT_LOG_DIR, EMOTION_DATA_FILE, EMOTION_ROLLUP_FILE, USER_DATA_FILE,
+            f"{EMOTION_SERIES_BASE}.ts", f"{EMOTION_SERIES_BASE}.codes", f"{EMOTION_SERIES_BASE}.meta.json",
+            SQLITE_DB_NAME, f"{SQLITE_DB_NAME}-wal", f"{SQLITE_DB_NAME}-shm"
+        ]
+        shard = hashlib.sha1(DEFAULT_USER_ID.encode('utf-8')).hexdigest()[:2]
+        target_dir = os.path.join(USERS_DIR, shard, DEFAULT_USER_ID)
+        
+        for name in names:
+            source = os.path.join(DATA_DIR, name)
+            target = os.path.join(target_dir, name)
+            if os.path.exists(source) and not os.path.exists(target):
+                os.makedirs(target_dir, exist_ok=True)
+                shutil.move(source, target)
+        
+        _global_data_migrated = True
+
+def _use_sqlite():
+    """Whether the SQLite backend is selected in config"""
+    return STORAGE_BACKEND == "sqlite"
+
+def _list_chat_segments():
+    """Return (start_index, path) for every chat log segment, oldest first"""
+    if not os.path.isdir(_user_path(CHAT_LOG_DIR)):
         return []
+    
+    segments = []
+    for name in os.listdir(_user_path(CHAT_LOG_DIR)):
+        if name.startswith("segment_") and name.endswith(".jsonl"):
+            try:
+                start = int(name[len("segment_"):-len(".jsonl")])
+            except ValueError:
+                continue
+            segments.append((start, os.path.join(_user_path(CHAT_LOG_DIR), name)))
+    return sorted(segments)
+
+def _segment_path(start_index):
+    """Path of the segment whose first message has the given index"""
+    return os.path.join(_user_path(CHAT_LOG_DIR), f"segment_{start_index:010d}.jsonl")
+
+def _decode_record(line):
+    """The chat record on one segment line, or None for a blank or torn line"""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        record = json.loads(line)
+    except ValueError:
+        return None
+    if isinstance(record, dict) and 'role' in record and 'content' in record:
+        return record
+    return None
+
+def _parse_segment(f):
+    """Parse the messages of one chat log segment"""
+    messages = []
+    for line in f:
+        # Skips a torn trailing line left by an interrupted write
+        record = _decode_record(line)
+        if record is not None:
+            messages.append([record['role'], record['content']])
+    return messages
+
+def _read_segment(path):
+    """Read all messages from one chat log segment"""
+    return json_cache.load_cached(path, _parse_segment)
+
+def _count_segment_records(path):
+    """Count the records in a segment that reads will return"""
+    return len(_read_segment(path))
+
+def _repair_segment_tail(path):
+    """Make a segment end with a newline before records are appended to it
+
+    A fragment torn off by an interrupted write is cut off, as the emotion
+    columns drop their torn tail, so the next record is not glued onto it;
+    a last record that only lacks its newline is kept.
+    """
+    with open(path, 'rb+') as f:
+        data = f.read()
+        if not data or data.endswith(b"\n"):
+            return
+        start = data.rfind(b"\n") + 1
+        if _decode_record(data[start:].decode('utf-8', errors='replace')) is not None:
+            f.write(b"\n")
+        else:
+            f.truncate(start)
+    json_cache.invalidate(path)
+
+def _chat_log_end():
+    """Index the next appended message will get
+
+    Indexes keep counting after retention removes old segments.
+    """
+    segments = _list_chat_segments()
+    if not segments:
+        return 0
+    start, path = segments[-1]
+    return start + _count_segment_records(path)
+
+def _chat_log_length():
+    """Number of messages currently kept in the chat log"""
+    segments = _list_chat_segments()
+    if not segments:
+        return 0
+    return _chat_log_end() - segments[0][0]
+
+def _iter_segment_records(path):
+    """Yield the raw records of one segment line by line, without caching
+
+    A segment retention has removed since it was listed yields nothing.
+    """
+    try:
+        f = open(path, 'r', encoding='utf-8')
+    except FileNotFoundError:
+        return
+    with f:
+        for line in f:
+            record = _decode_record(line)
+            if record is not None:
+                yield record
+
+def _append_chat_messages(messages, start_index, timestamps=None):
+    """Append messages to the tail segment, rotating when it is full
+
+    timestamps optionally gives an ISO timestamp per message; by default
+    all messages are stamped with the current time.
+    """
+    os.makedirs(_user_path(CHAT_LOG_DIR), exist_ok=True)
+    
+    segments = _list_chat_segments()
+    if segments:
+        segment_start, path = segments[-1]
+        segment_count = start_index - segment_start
+        _repair_segment_tail(path)
+    else:
+        segment_start, path = start_index, _segment_path(start_index)
+        segment_count = 0
+    
+    now = datetime.now().isoformat()
+    index = start_index
+    tail_path = path
+    f = open(path, 'a', encoding='utf-8')
+    try:
+        for position, (role, message) in enumerate(messages):
+            if segment_count >= CHAT_SEGMENT_SIZE:
+                f.close()
+                path = _segment_path(index)
+                f = open(path, 'a', encoding='utf-8')
+                segment_count = 0
+            
+            timestamp = timestamps[position] if timestamps else now
+            record = {'role': role, 'content': message, 'ts': timestamp or now}
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            segment_count += 1
+            index += 1
+    finally:
+        f.close()
+        # Segments created by rotation are new files; only the old tail can be cached
+        json_cache.invalidate(tail_path)
+
+def _remove_chat_log():
+    """Delete every chat log segment, the summary built from them and the history id"""
+    with _chat_summary_lock:
+        for _, path in _list_chat_segments():
+            os.remove(path)
+            json_cache.invalidate(path)
+        for path in (_user_path(CHAT_SUMMARY_FILE), _history_id_path()):
+            if os.path.exists(path):
+                os.remove(path)
+                json_cache.invalidate(path)
+
+def _migrate_legacy_chat_history():
+    """Move a legacy data/chat_history.json into the segmented chat log"""
+    if not os.path.exists(_user_path(CHAT_HISTORY_FILE)) or _list_chat_segments():
+        return
+    
+    data = json_cache.load_cached(_user_path(CHAT_HISTORY_FILE))
+    messages = data.get('messages', []) if isinstance(data, dict) else data
+    
+    if messages:
+        _append_chat_messages(messages, 0)
+    os.replace(_user_path(CHAT_HISTORY_FILE), _user_path(CHAT_HISTORY_FILE) + ".bak")
+    json_cache.invalidate(_user_path(CHAT_HISTORY_FILE))
+
+def load_chat_history(limit=None):
+    """Load chat history from the chat log
+
+    When limit is given only the newest segments needed to cover the last
+    `limit` messages are read.
+    """
+    return load_chat_window(limit)[1]
+
+def load_chat_window(limit=None):
+    """Load chat history together with the index of its first message
+
+    Message indexes count every message ever stored, so they stay valid after
+    retention removes old messages. Returns (offset, messages).
+    """
+    try:
+        if _use_sqlite():
+            return sqlite_storage.load_messages_window(_sqlite_db(), limit)
+        
+        _migrate_legacy_chat_history()
+        
+        segments = _list_chat_segments()
+        chunks = []
+        loaded = 0
+        end = 0
+        for start, path in reversed(segments):
+            try:
+                segment = _read_segment(path)
+            except FileNotFoundError:
+                # Retention removed it, and so every older segment, after the listing
+                break
+            if not chunks:
+                end = start + len(segment)
+            chunks.append(segment)
+            loaded += len(segment)
+            if limit is not None and loaded >= limit:
+                break
+        
+        messages = [message for chunk in reversed(chunks) for message in chunk]
+        if limit is not None:
+            messages = messages[-limit:] if limit > 0 else []
+        return end - len(messages), messages
     except Exception as e:
         st.error(f"Error loading chat history: {e}")
-        return []
+        return 0, []
 
 def save_chat_history(chat_history):
-    """Save chat history to file"""
+    """Save chat history to the chat log
+
+    Only messages not yet on disk are appended, so the cost of a save does not
+    grow with the length of the conversation. A history shorter than what is
+    stored (e.g. after cleanup) replaces the log.
+    """
     try:
-        data = {
-            'messages': chat_history,
-            'last_updated': datetime.now().isoformat(),
-            'total_messages': len(chat_history)
-        }
+        if _use_sqlite():
+            persisted = sqlite_storage.count_messages(_sqlite_db())
+            if len(chat_history) < persisted:
+                sqlite_storage.clear_messages(_sqlite_db())
+                persisted = 0
+            if len(chat_history) > persisted:
+                sqlite_storage.append_messages(_sqlite_db(), chat_history[persisted:])
+                _schedule_retention()
+            return True
         
-        with open(CHAT_HISTORY_FILE, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        _migrate_legacy_chat_history()
         
+        persisted = _chat_log_length()
+        if len(chat_history) < persisted:
+            _remove_chat_log()
+            persisted = 0
+        
+        if len(chat_history) > persisted:
+            _append_chat_messages(chat_history[persisted:], _chat_log_end())
+            _schedule_retention()
+        elif not chat_history:
+            os.makedirs(_user_path(CHAT_LOG_DIR), exist_ok=True)
+        
+        return True
+    except Exception as e:
+        st.error(f"Error saving chat history: {e}")
+        return False
+
+def iter_chat_records():
+    """Yield every stored chat message as {'role', 'content', 'ts'}, oldest first
+
+    Records are streamed so memory use does not depend on history size.
+    """
+    for _, record in iter_indexed_chat_records():
+        yield record
+
+def iter_indexed_chat_records(start=0):
+    """Yield (index, record) for the stored messages with index >= start
+
+    Indexes are those of load_chat_window, so a consumer can remember where
+    it stopped and resume there.
+    """
+    if _use_sqlite():
+        for index, role, content, timestamp in sqlite_storage.iter_messages(_sqlite_db(), start=start):
+            yield index, {'role': role, 'content': content, 'ts': timestamp}
+        return
+    
+    _migrate_legacy_chat_history()
+    segments = _list_chat_segments()
+    for position, (segment_start, path) in enumerate(segments):
+        # Skip segments that end before start without reading them
+        if position + 1 < len(segments) and segments[position + 1][0] <= start:
+            continue
+        for index, record in enumerate(_iter_segment_records(path), segment_start):
+            if index >= start:
+                yield index, {'role': record['role'], 'content': record['content'], 'ts': record.get('ts')}
+
+def list_user_ids():
+    """Ids of every user with a data directory"""
+    _migrate_global_data()
+    if not os.path.isdir(USERS_DIR):
+        return []
+    return sorted(
+        user_id
+        for shard in os.listdir(USERS_DIR) if os.path.isdir(os.path.join(USERS_DIR, shard))
+        for user_id in os.listdir(os.path.join(USERS_DIR, shard))
+        if os.path.isdir(os.path.join(USERS_DIR, shard, user_id))
+    )
+
+def append_chat_records(records):
+    """Append chat records ({'role', 'content', 'ts'}) after the stored history"""
+    if not records:
+        return
+    
+    messages = [(record['role'], record['content']) for record in records]
+    timestamps = [record.get('ts') for record in records]
+    
+    if _use_sqlite():
+        sqlite_storage.append_messages(_sqlite_db(), messages, timestamps)
+        _schedule_retention()
+        return
+    
+    _migrate_legacy_chat_history()
+    _append_chat_messages(messages, _chat_log_end(), timestamps)
+    _schedule_retention()
+
+def append_chat_messages(messages):
+    """Append new (role, message) pairs to the stored chat history
+
+    Unlike save_chat_history this does not compare against what is already
+    stored, so it stays correct after retention has removed old messages.
+    """
+    try:
+        append_chat_records([{'role': role, 'content': message} for role, message in messages])
         return True
     except Exception as e:
         st.error(f"Error saving chat history: {e}")
         return False
 
+# Serializes summary writes with clearing the chat log (JSON backend)
+_chat_summary_lock = threading.RLock()
+
+def _history_id_path():
+    return os.path.join(_user_path(CHAT_LOG_DIR), CHAT_HISTORY_ID_FILE)
+
+def chat_history_id():
+    """Id of the stored chat history, replaced whenever the history is cleared"""
+    if _use_sqlite():
+        return sqlite_storage.load_history_id(_sqlite_db())
+    path = _history_id_path()
+    if not os.path.exists(path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(uuid.uuid4().hex)
+        try:
+            # Fails if another thread created the id first; theirs is kept
+            os.link(tmp_path, path)
+        except FileExistsError:
+            pass
+        finally:
+            os.remove(tmp_path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return f.read().strip()
+
+def load_chat_summary():
+    """Rolling summary of older chat messages as {'summary': str, 'covered': int, 'history_id': str}
+
+    'covered' is the index of the first message the summary does not include;
+    'history_id' is chat_history_id() of the history it summarizes.
+    """
+    history_id = chat_history_id()
+    if _use_sqlite():
+        return dict(sqlite_storage.load_chat_summary(_sqlite_db()), history_id=history_id)
+    path = _user_path(CHAT_SUMMARY_FILE)
+    if not os.path.exists(path):
+        return {'summary': "", 'covered': 0, 'history_id': history_id}
+    data = json_cache.load_cached(path)
+    return {'summary': data.get('summary', ""), 'covered': data.get('covered', 0), 'history_id': history_id}
+
+def save_chat_summary(summary, covered, history_id=None):
+    """Store the rolling summary of every message before index `covered`
+
+    With history_id (from load_chat_summary) a summary of a history that has
+    been cleared since is not stored. Returns whether it was stored.
+    """
+    if _use_sqlite():
+        return sqlite_storage.save_chat_summary(_sqlite_db(), summary, covered, history_id)
+    with _chat_summary_lock:
+        if history_id is not None and history_id != chat_history_id():
+            return False
+        _write_json_atomic(_user_path(CHAT_SUMMARY_FILE), {
+            'summary': summary,
+            'covered': covered,
+            'last_updated': datetime.now().isoformat()
+        })
+        return True
+
 def clear_chat_history():
     """Clear all chat history"""
     try:
-        if os.path.exists(CHAT_HISTORY_FILE):
-            os.remove(CHAT_HISTORY_FILE)
+        if _use_sqlite():
+            sqlite_storage.clear_messages(_sqlite_db())
+        _remove_chat_log()
+        for name in (CHAT_HISTORY_FILE, CHAT_ROLLUP_FILE):
+            if os.path.exists(_user_path(name)):
+                os.remove(_user_path(name))
+                json_cache.invalidate(_user_path(name))
         
         # Clear from session state
         if "chat_history" in st.session_state:
             st.session_state.chat_history = []
+            st.session_state.chat_history_offset = 0
         
         return True
     except Exception as e:
         st.error(f"Error clearing chat history: {e}")
         return False
 
+def _write_json_atomic(path, data, **dump_kwargs):
+    """Write JSON to a temp file and rename it over path"""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, **dump_kwargs)
+    os.replace(tmp_path, path)
+    json_cache.invalidate(path)
+
+# Serializes appends to the emotion series with retention rewriting it
+_emotion_store_lock = threading.RLock()
+
+def _write_emotion_batch(entries, update_rollups=True):
+    """Persist a batch of emotion entries with a single write"""
+    if _use_sqlite():
+        sqlite_storage.add_emotions(_sqlite_db(), entries, update_rollups=update_rollups)
+        return
+    
+    with _emotion_store_lock:
+        _migrate_legacy_emotion_data()
+        
+        # Build rollups from the raw entries before retention trims them
+        if update_rollups and not os.path.exists(_user_path(EMOTION_ROLLUP_FILE)):
+            _rebuild_emotion_rollups()
+        
+        emotion_series.append_entries(_user_path(EMOTION_SERIES_BASE), entries)
+        
+        if update_rollups:
+            _update_emotion_rollups(entries)
+
+def _write_queued_emotions(items):
+    """Write a batch from the emotion queue, one write per user"""
+    by_user = {}
+    for item in items:
+        by_user.setdefault(item[0], []).append(item)
+    
+    failed = []
+    for user_id, user_items in by_user.items():
+        try:
+            with use_user(user_id):
+                _write_emotion_batch([entry for _, entry in user_items])
+                _schedule_retention()
+        except Exception:
+            logger.exception("Failed to write %d emotion entries for user %s", len(user_items), user_id)
+            failed.extend(user_items)
+    if failed:
+        # Retry only the failed users' entries so other users' are not written twice
+        raise RetryItems(failed)
+
+_emotion_writer = WriteBehindQueue(
+    _write_queued_emotions,
+    flush_interval=EMOTION_FLUSH_INTERVAL,
+    max_batch=EMOTION_FLUSH_BATCH,
+    name="emotion-writer"
+)
+
 def save_emotion_data(emotion, timestamp):
-    """Save emotion data with timestamp"""
+    """Queue an emotion entry to be saved by the background writer"""
     try:
-        # Load existing emotion data
-        emotion_data = load_emotion_data()
-        
-        # Add new emotion entry
-        new_entry = {
+        # The writer thread has no session, so the user is captured here
+        _emotion_writer.submit((current_user_id(), {
             'emotion': emotion,
             'timestamp': timestamp.isoformat(),
             'date': timestamp.date().isoformat()
-        }
-        
-        emotion_data.append(new_entry)
-        
-        # Keep only last 1000 entries to prevent file from getting too large
-        if len(emotion_data) > 1000:
-            emotion_data = emotion_data[-1000:]
-        
-        # Save back to file
-        with open(EMOTION_DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump({
-                'emotions': emotion_data,
-                'last_updated': datetime.now().isoformat(),
-                'total_entries': len(emotion_data)
-            }, f, ensure_ascii=False, indent=2)
-        
+        }))
         return True
     except Exception as e:
         st.error(f"Error saving emotion data: {e}")
         return False
 
+def flush_emotion_data():
+    """Write any queued emotion entries now"""
+    _emotion_writer.flush()
+
+def import_emotion_entries(entries, update_rollups=True):
+    """Store already-dated emotion entries directly, bypassing the write queue"""
+    flush_emotion_data()
+    _write_emotion_batch(list(entries), update_rollups)
+    _schedule_retention()
+
+def clear_emotion_data():
+    """Delete the current user's emotion entries and their rollups, queued ones included"""
+    user_id = current_user_id()
+    _emotion_writer.discard(lambda item: item[0] == user_id)
+    if _use_sqlite():
+        sqlite_storage.clear_emotions(_sqlite_db())
+        return
+    
+    with _emotion_store_lock:
+        for name in (EMOTION_DATA_FILE, EMOTION_ROLLUP_FILE):
+            if os.path.exists(_user_path(name)):
+                os.remove(_user_path(name))
+                json_cache.invalidate(_user_path(name))
+        emotion_series.remove(_user_path(EMOTION_SERIES_BASE))
+
+def _migrate_legacy_emotion_data():
+    """Move a legacy data/emotions.json into the compact emotion series"""
+    if not os.path.exists(_user_path(EMOTION_DATA_FILE)) or emotion_series.exists(_user_path(EMOTION_SERIES_BASE)):
+        return
+    
+    data = json_cache.load_cached(_user_path(EMOTION_DATA_FILE))
+    entries = []
+    for entry in data.get('emotions', []):
+        try:
+            datetime.fromisoformat(entry['timestamp'])
+            entries.append(entry)
+        except (KeyError, ValueError, TypeError):
+            continue
+    
+    emotion_series.append_entries(_user_path(EMOTION_SERIES_BASE), entries)
+    os.replace(_user_path(EMOTION_DATA_FILE), _user_path(EMOTION_DATA_FILE) + ".bak")
+    json_cache.invalidate(_user_path(EMOTION_DATA_FILE))
+
+def _has_emotion_data():
+    """Whether any raw emotion data is stored in the JSON backend"""
+    return emotion_series.exists(_user_path(EMOTION_SERIES_BASE)) or os.path.exists(_user_path(EMOTION_DATA_FILE))
+
+def _iter_emotion_file():
+    """Yield the raw emotion entries, at most the retention policy's max_count
+
+    Entries are decoded one at a time from the memory-mapped series.
+    """
+    _migrate_legacy_emotion_data()
+    max_count = _retention_policy("emotions").get("max_count")
+    with emotion_series.open_series(_user_path(EMOTION_SERIES_BASE)) as series:
+        if max_count is not None:
+            series = series.tail(max_count)
+        yield from series.entries()
+
+def _read_emotion_file():
+    """Read the raw emotion entries, at most the retention policy's max_count"""
+    return list(_iter_emotion_file())
+
+def load_emotion_series(start=None, end=None):
+    """Load raw emotion entries with start <= timestamp < end as an EmotionSeries
+
+    The JSON backend slices its memory-mapped series file by time, so only
+    the requested range is copied into memory.
+    """
+    flush_emotion_data()
+    
+    if _use_sqlite():
+        since_date = start.date().isoformat() if isinstance(start, datetime) else None
+        series = emotion_series.EmotionSeries()
+        for entry in sqlite_storage.load_emotions(_sqlite_db(), since_date):
+            series.append(entry['emotion'], entry['timestamp'])
+        return series.between(start, end)
+    
+    _migrate_legacy_emotion_data()
+    return emotion_series.load_series(_user_path(EMOTION_SERIES_BASE), start, end)
+
 def load_emotion_data():
     """Load emotion data from file"""
     try:
-        if os.path.exists(EMOTION_DATA_FILE):
-            with open(EMOTION_DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('emotions', [])
-        return []
+        flush_emotion_data()
+        
+        if _use_sqlite():
+            return sqlite_storage.load_emotions(_sqlite_db())
+        
+        return _read_emotion_file()
     except Exception as e:
         st.error(f"Error loading emotion data: {e}")
         return []
 
+def iter_emotion_data():
+    """Yield every stored emotion entry, oldest first"""
+    flush_emotion_data()
+    if _use_sqlite():
+        yield from sqlite_storage.iter_emotions(_sqlite_db())
+    else:
+        yield from _iter_emotion_file()
+
+def _read_emotion_rollups():
+    """Read the per-day rollup file as {date: {emotion: count}}"""
+    if not os.path.exists(_user_path(EMOTION_ROLLUP_FILE)):
+        return {}
+    days = json_cache.load_cached(_user_path(EMOTION_ROLLUP_FILE)).get('days', {})
+    # Copy so callers can update counts without touching the cached data
+    return {date: dict(counts) for date, counts in days.items()}
+
+def _write_emotion_rollups(days):
+    """Write the per-day rollup file"""
+    _write_json_atomic(_user_path(EMOTION_ROLLUP_FILE), {
+        'days': days,
+        'last_updated': datetime.now().isoformat()
+    })
+
+def _update_emotion_rollups(entries):
+    """Add emotion entries to the per-day rollup counts"""
+    days = _read_emotion_rollups()
+    for entry in entries:
+        counts = days.setdefault(entry['date'], {})
+        counts[entry['emotion']] = counts.get(entry['emotion'], 0) + 1
+    _write_emotion_rollups(days)
+
+def _rebuild_emotion_rollups():
+    """Recompute the per-day rollups from the raw emotion entries"""
+    _migrate_legacy_emotion_data()
+    with emotion_series.open_series(_user_path(EMOTION_SERIES_BASE)) as series:
+        days = series.daily_counts()
+    _write_emotion_rollups(days)
+    return days
+
+def load_emotion_rollups():
+    """Load all per-day emotion counts as {date: {emotion: count}}"""
+    flush_emotion_data()
+    if _use_sqlite():
+        return sqlite_storage.load_daily_emotion_counts(_sqlite_db(), since_date="") or {}
+    if not os.path.exists(_user_path(EMOTION_ROLLUP_FILE)) and _has_emotion_data():
+        return _rebuild_emotion_rollups()
+    return _read_emotion_rollups()
+
+def merge_emotion_rollups(days):
+    """Add per-day emotion counts ({date: {emotion: count}}) to the stored rollups"""
+    flush_emotion_data()
+    if _use_sqlite():
+        sqlite_storage.add_daily_emotion_counts(_sqlite_db(), days)
+        return
+    
+    stored = load_emotion_rollups()
+    for date, counts in days.items():
+        stored_counts = stored.setdefault(date, {})
+        for emotion, count in counts.items():
+            stored_counts[emotion] = stored_counts.get(emotion, 0) + count
+    _write_emotion_rollups(stored)
+
+def _load_emotion_rollups_since(cutoff_date):
+    """Load per-day emotion counts dated on or after cutoff_date
+
+    Returns {date: {emotion: count}}, or None when no emotion data is
+    stored at all.
+    """
+    flush_emotion_data()
+    
+    if _use_sqlite():
+        return sqlite_storage.load_daily_emotion_counts(_sqlite_db(), since_date=cutoff_date.isoformat())
+    
+    if os.path.exists(_user_path(EMOTION_ROLLUP_FILE)):
+        days = _read_emotion_rollups()
+    elif _has_emotion_data():
+        days = _rebuild_emotion_rollups()
+    else:
+        days = {}
+    
+    if not days:
+        return None
+    
+    # ISO dates compare correctly as strings
+    cutoff = cutoff_date.isoformat()
+    return {date: counts for date, counts in days.items() if date >= cutoff}
+
 def get_emotion_summary(days=7):
     """Get emotion summary for the last N days"""
     try:
-        emotion_data = load_emotion_data()
-        
-        if not emotion_data:
-            return {"message": "No emotion data available"}
-        
-        # Filter data for the last N days
         cutoff_date = datetime.now().date() - timedelta(days=days)
-        recent_emotions = []
+        daily_counts = _load_emotion_rollups_since(cutoff_date)
         
-        for entry in emotion_data:
-            try:
-                entry_date = datetime.fromisoformat(entry['date']).date()
-                if entry_date >= cutoff_date:
-                    recent_emotions.append(entry)
-            except (KeyError, ValueError):
-                continue
+        if daily_counts is None:
+            return {"message": "No emotion data available"}
         
-        if not recent_emotions:
+        if not daily_counts:
             return {"message": f"No emotion data from the last {days} days"}
         
         # Calculate statistics
         emotion_counts = {}
         daily_emotions = {}
         
-        for entry in recent_emotions:
-            emotion = entry['emotion']
-            date = entry['date']
-            
-            # Count emotions
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-            
-            # Group by date
-            if date not in daily_emotions:
-                daily_emotions[date] = []
-            daily_emotions[date].append(emotion)
+        for date, counts in sorted(daily_counts.items()):
+            daily_emotions[date] = []
+            for emotion, count in counts.items():
+                # Count emotions
+                emotion_counts[emotion] = emotion_counts.get(emotion, 0) + count
+                
+                # Group by date
+                daily_emotions[date].extend([emotion] * count)
         
         # Calculate percentages
-        total_interactions = len(recent_emotions)
+        total_interactions = sum(emotion_counts.values())
         emotion_percentages = {
             emotion: round((count / total_interactions) * 100, 1)
             for emotion, count in emotion_counts.items()
@@ -163,28 +852,13 @@ def get_emotion_summary(days=7):
 def get_mood_trends(days=30):
     """Get mood trends over time"""
     try:
-        emotion_data = load_emotion_data()
+        cutoff_date = datetime.now().date() - timedelta(days=days)
+        daily_counts = _load_emotion_rollups_since(cutoff_date)
         
-        if not emotion_data:
+        if daily_counts is None:
             return {"message": "No emotion data available for trend analysis"}
         
-        # Filter data for the last N days
-        cutoff_date = datetime.now().date() - timedelta(days=days)
-        trend_data = {}
-        
-        for entry in emotion_data:
-            try:
-                entry_date = datetime.fromisoformat(entry['date']).date()
-                if entry_date >= cutoff_date:
-                    date_str = entry_date.isoformat()
-                    emotion = entry['emotion']
-                    
-                    if date_str not in trend_data:
-                        trend_data[date_str] = {}
-                    
-                    trend_data[date_str][emotion] = trend_data[date_str].get(emotion, 0) + 1
-            except (KeyError, ValueError):
-                continue
+        trend_data = {date: dict(counts) for date, counts in sorted(daily_counts.items())}
         
         return {
             "trend_data": trend_data,
@@ -198,11 +872,14 @@ def get_mood_trends(days=30):
 def save_user_preferences(preferences):
     """Save user preferences"""
     try:
-        with open(USER_DATA_FILE, 'w', encoding='utf-8') as f:
-            json.dump({
-                'preferences': preferences,
-                'last_updated': datetime.now().isoformat()
-            }, f, ensure_ascii=False, indent=2)
+        if _use_sqlite():
+            sqlite_storage.save_preferences(_sqlite_db(), preferences)
+            return True
+        
+        _write_json_atomic(_user_path(USER_DATA_FILE), {
+            'preferences': preferences,
+            'last_updated': datetime.now().isoformat()
+        }, indent=2)
         return True
     except Exception as e:
         st.error(f"Error saving user preferences: {e}")
@@ -211,10 +888,12 @@ def save_user_preferences(preferences):
 def load_user_preferences():
     """Load user preferences"""
     try:
-        if os.path.exists(USER_DATA_FILE):
-            with open(USER_DATA_FILE, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-                return data.get('preferences', {})
+        if _use_sqlite():
+            return sqlite_storage.load_preferences(_sqlite_db())
+        
+        if os.path.exists(_user_path(USER_DATA_FILE)):
+            data = json_cache.load_cached(_user_path(USER_DATA_FILE))
+            return dict(data.get('preferences', {}))
         return {}
     except Exception as e:
         st.error(f"Error loading user preferences: {e}")
@@ -225,22 +904,28 @@ def get_chat_statistics():
     try:
         chat_history = load_chat_history()
         
-        if not chat_history:
+        # Messages removed by retention are still counted through the rollups
+        archived = {}
+        for counts in load_chat_rollups().values():
+            for key, value in counts.items():
+                archived[key] = archived.get(key, 0) + value
+        
+        if not chat_history and not archived:
             return {"message": "No chat data available"}
         
         # Count messages by role
-        user_messages = sum(1 for role, _ in chat_history if role == "user")
-        assistant_messages = sum(1 for role, _ in chat_history if role == "assistant")
+        user_messages = sum(1 for role, _ in chat_history if role == "user") + archived.get("user", 0)
+        assistant_messages = sum(1 for role, _ in chat_history if role == "assistant") + archived.get("assistant", 0)
         
         # Calculate average message length
-        user_msg_lengths = [len(msg) for role, msg in chat_history if role == "user"]
-        assistant_msg_lengths = [len(msg) for role, msg in chat_history if role == "assistant"]
+        user_chars = sum(len(msg) for role, msg in chat_history if role == "user") + archived.get("user_chars", 0)
+        assistant_chars = sum(len(msg) for role, msg in chat_history if role == "assistant") + archived.get("assistant_chars", 0)
         
-        avg_user_length = sum(user_msg_lengths) / len(user_msg_lengths) if user_msg_lengths else 0
-        avg_assistant_length = sum(assistant_msg_lengths) / len(assistant_msg_lengths) if assistant_msg_lengths else 0
+        avg_user_length = user_chars / user_messages if user_messages else 0
+        avg_assistant_length = assistant_chars / assistant_messages if assistant_messages else 0
         
         return {
-            "total_messages": len(chat_history),
+            "total_messages": len(chat_history) + archived.get("user", 0) + archived.get("assistant", 0),
             "user_messages": user_messages,
             "assistant_messages": assistant_messages,
             "avg_user_message_length": round(avg_user_length, 1),
@@ -267,14 +952,26 @@ def estimate_sessions(chat_history):
 def clear_all_data():
     """Clear all stored data (chat, emotions, preferences)"""
     try:
-        files_to_clear = [CHAT_HISTORY_FILE, EMOTION_DATA_FILE, USER_DATA_FILE]
+        user_id = current_user_id()
+        _emotion_writer.discard(lambda item: item[0] == user_id)
+        
+        if _use_sqlite():
+            sqlite_storage.clear_all(_sqlite_db())
+        
+        files_to_clear = [
+            _user_path(name)
+            for name in (CHAT_HISTORY_FILE, CHAT_ROLLUP_FILE, EMOTION_DATA_FILE, EMOTION_ROLLUP_FILE, USER_DATA_FILE)
+        ]
         
         for file_path in files_to_clear:
             if os.path.exists(file_path):
                 os.remove(file_path)
+                json_cache.invalidate(file_path)
+        _remove_chat_log()
+        emotion_series.remove(_user_path(EMOTION_SERIES_BASE))
         
         # Clear session state
-        session_keys_to_clear = ['chat_history', 'emotion_history', 'mood_history']
+        session_keys_to_clear = ['chat_history', 'chat_history_offset', 'emotion_history', 'mood_history']
         for key in session_keys_to_clear:
             if key in st.session_state:
                 del st.session_state[key]
@@ -285,28 +982,237 @@ def clear_all_data():
         st.error(f"Error clearing data: {e}")
         return False
 
-def export_data():
-    """Export all user data to a single JSON file"""
+# Retention: keeps raw data within RETENTION_POLICIES, folding what it
+# removes into per-day rollups so long-term statistics survive
+def _retention_policy(dataset):
+    """Retention settings for one dataset ("chat", "emotions", "session_emotions")"""
+    return RETENTION_POLICIES.get(dataset, {})
+
+def _raw_cutoff(policy):
+    """Oldest timestamp raw data may have under a policy, or None"""
+    days = [d for d in (policy.get("max_age_days"), policy.get("downsample_older_than_days")) if d]
+    return datetime.now() - timedelta(days=min(days)) if days else None
+
+def _rollup_cutoff_date(policy):
+    """Oldest ISO date rollups may have under a policy, or None"""
+    days = policy.get("max_age_days")
+    return (datetime.now().date() - timedelta(days=days)).isoformat() if days else None
+
+def load_chat_rollups():
+    """Per-day counts of chat messages removed by retention
+
+    Returns {date: {"user": n, "assistant": n, "user_chars": n, "assistant_chars": n}}.
+    """
+    if _use_sqlite():
+        return sqlite_storage.load_chat_daily_counts(_sqlite_db())
+    path = _user_path(CHAT_ROLLUP_FILE)
+    if not os.path.exists(path):
+        return {}
+    return dict(json_cache.load_cached(path).get('days', {}))
+
+def merge_chat_rollups(days):
+    """Add per-day chat counts (as returned by load_chat_rollups) to the stored rollups"""
+    if _use_sqlite():
+        sqlite_storage.add_chat_daily_counts(_sqlite_db(), days)
+        return
+    
+    rollup_path = _user_path(CHAT_ROLLUP_FILE)
+    data = json_cache.load_cached(rollup_path) if os.path.exists(rollup_path) else {}
+    stored = {date: dict(counts) for date, counts in data.get('days', {}).items()}
+    for date, counts in days.items():
+        stored_counts = stored.setdefault(date, {})
+        for key, value in counts.items():
+            stored_counts[key] = stored_counts.get(key, 0) + value
+    _write_json_atomic(rollup_path, dict(data, days=stored, last_updated=datetime.now().isoformat()))
+
+def _segment_last_timestamp(path):
+    """Timestamp of the newest record in a chat log segment, or None"""
+    last = None
+    for record in _iter_segment_records(path):
+        last = record.get('ts') or last
     try:
-        export_data = {
-            'chat_history': load_chat_history(),
-            'emotion_data': load_emotion_data(),
-            'user_preferences': load_user_preferences(),
-            'export_timestamp': datetime.now().isoformat(),
-            'version': '1.0'
-        }
+        return datetime.fromisoformat(last) if last else None
+    except ValueError:
+        return None
+
+def _fold_chat_segments(paths):
+    """Add the messages of chat log segments to the chat rollups"""
+    rollup_path = _user_path(CHAT_ROLLUP_FILE)
+    data = json_cache.load_cached(rollup_path) if os.path.exists(rollup_path) else {}
+    days = {date: dict(counts) for date, counts in data.get('days', {}).items()}
+    log_dir = _user_path(CHAT_LOG_DIR)
+    folded = {name for name in data.get('folded_segments', []) if os.path.exists(os.path.join(log_dir, name))}
+    
+    for path in paths:
+        name = os.path.basename(path)
+        # Skip segments already folded by a pass interrupted before deleting them
+        if name in folded:
+            continue
+        for record in _iter_segment_records(path):
+            date = (record.get('ts') or "unknown")[:10]
+            role = record['role']
+            counts = days.setdefault(date, {})
+            counts[role] = counts.get(role, 0) + 1
+            counts[f"{role}_chars"] = counts.get(f"{role}_chars", 0) + len(record['content'])
+        folded.add(name)
+    
+    _write_json_atomic(rollup_path, {
+        'days': days,
+        'folded_segments': sorted(folded),
+        'last_updated': datetime.now().isoformat()
+    })
+
+def _compact_chat_log(policy):
+    """Fold and delete whole chat segments that fall outside the policy
+
+    The tail segment is never removed, so appends are unaffected. Returns
+    the number of messages removed.
+    """
+    segments = _list_chat_segments()
+    if len(segments) < 2:
+        return 0
+    
+    end = _chat_log_end()
+    max_count = policy.get("max_count")
+    cutoff = _raw_cutoff(policy)
+    
+    expired = []
+    for (start, path), (next_start, _) in zip(segments, segments[1:]):
+        over_count = max_count is not None and end - next_start >= max_count
+        last_timestamp = _segment_last_timestamp(path) if cutoff and not over_count else None
+        too_old = last_timestamp is not None and last_timestamp < cutoff
+        if not (over_count or too_old):
+            break
+        expired.append(path)
+    
+    removed = 0
+    if expired:
+        _fold_chat_segments(expired)
+        for path in expired:
+            removed += _count_segment_records(path)
+            os.remove(path)
+            json_cache.invalidate(path)
+    
+    rollup_cutoff = _rollup_cutoff_date(policy)
+    rollups = load_chat_rollups()
+    if rollup_cutoff and any(date < rollup_cutoff for date in rollups):
+        data = json_cache.load_cached(_user_path(CHAT_ROLLUP_FILE))
+        _write_json_atomic(_user_path(CHAT_ROLLUP_FILE), dict(
+            data, days={date: counts for date, counts in rollups.items() if date >= rollup_cutoff}
+        ))
+    
+    return removed
+
+def _compact_emotions(policy):
+    """Trim the emotion series to the policy; rollups already hold the counts"""
+    base = _user_path(EMOTION_SERIES_BASE)
+    with _emotion_store_lock:
+        _migrate_legacy_emotion_data()
+        if not emotion_series.exists(base):
+            return 0
+        if not os.path.exists(_user_path(EMOTION_ROLLUP_FILE)):
+            _rebuild_emotion_rollups()
+        
+        series = emotion_series.load_series(base)
+        kept = series
+        cutoff = _raw_cutoff(policy)
+        if cutoff is not None:
+            kept = kept.between(start=cutoff)
+        if policy.get("max_count") is not None:
+            kept = kept.tail(policy["max_count"])
+        if len(kept) != len(series):
+            emotion_series.write_series(base, kept)
         
-        export_filename = f"mind_mirror_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        rollup_cutoff = _rollup_cutoff_date(policy)
+        if rollup_cutoff:
+            days = _read_emotion_rollups()
+            if any(date < rollup_cutoff for date in days):
+                _write_emotion_rollups({date: counts for date, counts in days.items() if date >= rollup_cutoff})
         
-        with open(export_filename, 'w', encoding='utf-8') as f:
-            json.dump(export_data, f, ensure_ascii=False, indent=2)
+        return len(series) - len(kept)
+
+def apply_retention():
+    """Apply the retention policies to the current user's data now
+
+    Returns the number of chat messages and emotion entries removed.
+    """
+    chat_policy = _retention_policy("chat")
+    emotion_policy = _retention_policy("emotions")
+    
+    if _use_sqlite():
+        chat_cutoff = _raw_cutoff(chat_policy)
+        emotion_cutoff = _raw_cutoff(emotion_policy)
+        return sqlite_storage.apply_retention(
+            _sqlite_db(),
+            chat_max_count=chat_policy.get("max_count"),
+            chat_keep_after=chat_cutoff.isoformat() if chat_cutoff else None,
+            chat_rollups_keep_after=_rollup_cutoff_date(chat_policy),
+            emotion_max_count=emotion_policy.get("max_count"),
+            emotion_keep_after=emotion_cutoff.isoformat() if emotion_cutoff else None,
+            emotion_rollups_keep_after=_rollup_cutoff_date(emotion_policy)
+        )
+    
+    return {
+        "chat_messages": _compact_chat_log(chat_policy),
+        "emotions": _compact_emotions(emotion_policy)
+    }
+
+def _run_retention(user_ids):
+    """Retention pass over the users written since the last pass"""
+    for user_id in set(user_ids):
+        try:
+            with use_user(user_id):
+                apply_retention()
+        except Exception:
+            logger.exception("Retention failed for user %s", user_id)
+
+# Users whose data changed are queued and compacted in the background,
+# at most once per RETENTION_INTERVAL
+_retention_queue = WriteBehindQueue(
+    _run_retention,
+    flush_interval=RETENTION_INTERVAL,
+    max_batch=1_000_000,
+    name="retention"
+)
+
+def _schedule_retention():
+    """Queue the current user for the next background retention pass"""
+    _retention_queue.submit(current_user_id())
+
+def export_data():
+    """Export all user data to a compressed archive
+
+    Records are streamed into the archive, so memory use does not depend on
+    history size. See data_export for the archive format.
+    """
+    try:
+        from data_export import export_archive
         
+        export_filename = f"mind_mirror_export_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip"
+        export_archive(export_filename)
         return export_filename
         
     except Exception as e:
         st.error(f"Error exporting data: {e}")
         return None
 
+def import_data(path, replace=False):
+    """Import an archive written by export_data (or a legacy JSON export)
+
+    With replace=True existing data is cleared first. Returns the number of
+    records imported per dataset, or None on error.
+    """
+    try:
+        from data_export import import_archive
+        
+        if replace:
+            clear_all_data()
+        return import_archive(path)
+        
+    except Exception as e:
+        st.error(f"Error importing data: {e}")
+        return None
+
 # Helper functions for data validation and migration
 def validate_data_integrity():
     """Check data integrity and fix common issues"""
@@ -350,14 +1256,13 @@ def validate_data_integrity():
     except Exception as e:
         return {"error": f"Error validating data: {e}"}
 
-# Initialize data structure on import
+# Storage is created lazily by the first write; this only needs to be called
+# to set it up ahead of time
 def initialize_data_structure():
     """Initialize basic data structure if files don't exist"""
-    if not os.path.exists(CHAT_HISTORY_FILE):
-        save_chat_history([])
+    if _use_sqlite():
+        sqlite_storage.get_connection(_sqlite_db())
+        return
     
-    if not os.path.exists(EMOTION_DATA_FILE):
-        save_emotion_data('neutral', datetime.now())
-
-# Run initialization
-initialize_data_structure()
\ No newline at end of file
+    if not os.path.isdir(_user_path(CHAT_LOG_DIR)) and not os.path.exists(_user_path(CHAT_HISTORY_FILE)):
+        save_chat_history([])
\ No newline at end of file
@@ -1,8 +1,37 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 import streamlit as st
-from config import initialize_groq_client
-from chat_memory import load_chat_history, save_chat_history
-from voice_chat_module import record_voice_input, speak_text
-from ai_responses import get_free_ai_response
+from config import initialize_groq_client, get_groq_client
+from chat_memory import load_chat_window, append_chat_messages, load_chat_summary, save_chat_summary, current_user_id, use_user
+from chat_context import build_context, fold_history, messages_to_fold, message_tokens, SUMMARY_MAX_TOKENS
+from voice_chat_module import record_voice_input, speak_text, speech_status, stop_speech, prewarm_speech, VOICE_POLL_INTERVAL
+from ai_responses import get_free_ai_response, request_hf_reply
+from provider_router import Provider, route, GROQ_DEADLINE, HF_DEADLINE
+from rate_limiter import call_with_retry
+import response_cache
+
+# Completion parameters for therapist replies
+COMPLETION_PARAMS = {"model": "llama3-70b-8192", "temperature": 0.7, "max_tokens": 500}
+
+# Minimum seconds between re-renders of a streaming reply
+STREAM_RENDER_INTERVAL = 0.05
+
+# Smaller, faster model used to fold older turns into the conversation summary
+SUMMARY_MODEL = "llama3-8b-8192"
+
+# Seconds a background summary fold may take, quota waits included
+SUMMARY_DEADLINE = float(os.getenv("MIND_MIRROR_SUMMARY_DEADLINE", 30))
+
+logger = logging.getLogger(__name__)
+
+# Summary folds run off the script thread, at most one per user at a time
+_summary_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="summary")
+_summary_folds = {}  # user id -> Future of the running fold
+_summary_lock = threading.Lock()
 
 def render_chat_page():
     """Render the main chat page"""
@@ -11,9 +40,13 @@ def render_chat_page():
     if st.session_state.voice_mode:
         st.markdown('<div class="voice-indicator">🎙️ Voice Mode Active</div>', unsafe_allow_html=True)
 
+    # Start the speech engine and have the canned phrases ready before the first reply
+    if st.session_state.tts_enabled:
+        prewarm_speech()
+
     # Initialize chat history
     if "chat_history" not in st.session_state:
-        st.session_state.chat_history = load_chat_history()
+        st.session_state.chat_history_offset, st.session_state.chat_history = load_chat_window()
 
     # Voice input section
     if st.session_state.voice_mode:
@@ -28,6 +61,7 @@ def render_chat_page():
 
     # Display chat history
     display_chat_history()
+    display_speech_status()
     
     # Process user input
     if user_input:
@@ -39,10 +73,39 @@ def display_chat_history():
     
     with chat_container:
         for role, message in st.session_state.chat_history:
-            avatar = st.session_state.user_avatar if role == "user" else st.session_state.bot_avatar
-            name = "You" if role == "user" else "Therapist"
-            bubble_class = "user" if role == "user" else "assistant"
-            st.markdown(f"""
+            st.markdown(message_html(role, message), unsafe_allow_html=True)
+
+def display_speech_status():
+    """Show what the background voice is doing for this session"""
+    status = speech_status()
+    if status["state"] != "idle":
+        _watch_speech_status()
+    elif status["error"] and st.session_state.get("speech_error_shown") != status["job_id"]:
+        st.session_state.speech_error_shown = status["job_id"]
+        st.warning(f"🔇 Speech error: {status['error']}")
+
+@st.fragment(run_every=VOICE_POLL_INTERVAL)
+def _watch_speech_status():
+    # Follows the speech without rerunning the page until it has finished
+    status = speech_status()
+    if status["state"] == "idle":
+        # The full run stops the polling and shows any error
+        st.rerun()
+    col1, col2 = st.columns([4, 1])
+    with col1:
+        waiting = f" ({status['queued']} waiting)" if status["queued"] else ""
+        st.caption(f"🔊 Speaking response...{waiting}")
+    with col2:
+        if st.button("⏹️ Stop", key="stop_speech"):
+            stop_speech()
+            st.rerun()
+
+def message_html(role, message):
+    """HTML for one chat bubble"""
+    avatar = st.session_state.user_avatar if role == "user" else st.session_state.bot_avatar
+    name = "You" if role == "user" else "Therapist"
+    bubble_class = "user" if role == "user" else "assistant"
+    return f"""
             <div class="chat-message {bubble_class}">
                 <img src="{avatar}" class="chat-avatar" />
                 <div>
@@ -50,59 +113,269 @@ def display_chat_history():
                     <div class="chat-bubble {bubble_class}">{message}</div>
                 </div>
             </div>
-            """, unsafe_allow_html=True)
+            """
+
+def rate_limit_key():
+    """Key that gives this session its own turn in the shared Groq rate limiter"""
+    if "rate_limit_key" not in st.session_state:
+        st.session_state.rate_limit_key = uuid.uuid4().hex
+    return st.session_state.rate_limit_key
+
+def estimate_request_tokens(messages, max_tokens):
+    """Tokens a completion request counts against the per-minute quota"""
+    return sum(message_tokens(message["content"]) for message in messages) + max_tokens
+
+def groq_provider(client, messages, session_key):
+    """Router provider streaming a Groq completion"""
+    def call(cancel, emit):
+        stream = call_with_retry(
+            lambda: client.chat.completions.create(messages=messages, stream=True, **COMPLETION_PARAMS),
+            tokens=estimate_request_tokens(messages, COMPLETION_PARAMS["max_tokens"]),
+            key=session_key,
+            timeout=GROQ_DEADLINE,
+            cancel=cancel
+        )
+        try:
+            for chunk in stream:
+                if cancel.is_set():
+                    return
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    emit(delta)
+        finally:
+            # Closing the response releases the connection of a cancelled stream
+            close = getattr(stream, "close", None)
+            if close is not None:
+                close()
+    return Provider("groq", call, GROQ_DEADLINE)
+
+def hf_provider(user_input, chat_history):
+    """Router provider asking the Hugging Face API"""
+    def call(cancel, emit):
+        reply = request_hf_reply(user_input, chat_history)
+        if reply and not cancel.is_set():
+            emit(reply)
+    return Provider("huggingface", call, HF_DEADLINE)
+
+def bubble_renderer(placeholder):
+    """on_text callback that renders a growing reply into placeholder"""
+    last_render = [0.0]
+    
+    def render(text):
+        # Re-rendering on every token would make the page the bottleneck
+        now = time.monotonic()
+        if now - last_render[0] >= STREAM_RENDER_INTERVAL:
+            placeholder.markdown(message_html("assistant", text + "▌"), unsafe_allow_html=True)
+            last_render[0] = now
+    return render
+
+def build_system_prompt(emotion=None):
+    """System prompt for the therapist, tuned to the user's detected emotion"""
+    return (
+        "You are a kind, empathetic therapist. "
+        "Mirror the language and tone of the user: "
+        "- If the user writes in English, reply in English.\n"
+        "- If the user writes in Tamil, reply in Tamil.\n"
+        "- If the user writes in Tanglish (Tamil + English), reply in Tanglish.\n"
+        "Your tone should be friendly, supportive, and informal. Do not translate the user's message—respond naturally in the same language or mix used."
+        f"The user's current emotional state appears to be: {emotion or 'unknown'}. "
+        "Please respond with appropriate empathy and support."
+    )
+
+def generate_reply(chat_history, offset=0, summary_state=None, emotion=None, client=None,
+                   session_key=None, on_text=None, use_cache=True):
+    """Get the therapist reply to the last message of chat_history
+
+    The Streamlit-free core of process_user_input. Groq is asked first and
+    the Hugging Face API is hedged in when Groq is slow or fails (see
+    provider_router.route). A context Groq answered recently is served from
+    the response cache; use_cache=False always calls the providers.
+    on_text(text so far) is called as the reply streams in.
+
+    Returns (reply, provider name), where the provider is "cache" for a
+    cached reply.
+    """
+    summary_state = summary_state or {'summary': "", 'covered': 0}
+    messages = build_context(build_system_prompt(emotion), chat_history, offset, summary_state)
+    
+    key = response_cache.make_key(messages, **COMPLETION_PARAMS)
+    if use_cache:
+        reply = response_cache.get(key)
+        if reply is not None:
+            return reply, "cache"
+    
+    if client is None:
+        client = get_groq_client(os.getenv("GROQ_API_KEY"))
+    user_input = chat_history[-1][1]
+    providers = [
+        groq_provider(client, messages, session_key),
+        hf_provider(user_input, list(chat_history))
+    ]
+    # route() only returns replies their provider finished, so a reply cut
+    # off midway is never cached
+    reply, provider = route(providers, on_text=on_text)
+    if use_cache and provider == "groq":
+        response_cache.put(key, reply)
+    return reply, provider
 
 def process_user_input(user_input):
     """Process user input and generate AI response"""
     # Add user message to chat history
     st.session_state.chat_history.append(("user", user_input))
 
-    # Build message history for Groq
-    messages = [
-        {
-            "role": "system",
-            "content": (
-                "You are a kind, empathetic therapist. "
-                "Mirror the language and tone of the user: "
-                "- If the user writes in English, reply in English.\n"
-                "- If the user writes in Tamil, reply in Tamil.\n"
-                "- If the user writes in Tanglish (Tamil + English), reply in Tanglish.\n"
-                "Your tone should be friendly, supportive, and informal. Do not translate the user's message—respond naturally in the same language or mix used."
-                f"The user's current emotional state appears to be: {st.session_state.last_detected_emotion or 'unknown'}. "
-                "Please respond with appropriate empathy and support."
-            )
-        }
-    ]
-
-    # Add recent chat history
-    for role, msg in st.session_state.chat_history[-10:]:  # Last 10 messages for context
-        messages.append({"role": role, "content": msg})
+    # Summary of older turns plus as many recent messages as fit the token budget
+    system_prompt = build_system_prompt(st.session_state.last_detected_emotion)
+    summary_state = load_chat_summary()
+    reply_options = dict(
+        offset=st.session_state.get("chat_history_offset", 0),
+        summary_state=summary_state,
+        emotion=st.session_state.last_detected_emotion,
+        session_key=rate_limit_key()
+    )
 
     # Get AI response
-    with st.spinner("Therapist is thinking..."):
+    if st.session_state.get("stream_replies", True):
+        # Show the new message now; the reply streams into the bubble below it
+        st.markdown(message_html("user", user_input), unsafe_allow_html=True)
+        placeholder = st.empty()
         try:
-            client = initialize_groq_client()
-            completion = client.chat.completions.create(
-                model="llama3-70b-8192",
-                messages=messages,
-                temperature=0.7,
-                max_tokens=500
+            reply, _ = generate_reply(
+                st.session_state.chat_history,
+                client=initialize_groq_client(),
+                on_text=bubble_renderer(placeholder),
+                **reply_options
             )
-            reply = completion.choices[0].message.content.strip()
+            placeholder.markdown(message_html("assistant", reply), unsafe_allow_html=True)
 
         except Exception as e:
+            placeholder.empty()
             st.error(f"Groq API Error: {e}")
             reply = get_free_ai_response(user_input, st.session_state.chat_history)
+    else:
+        with st.spinner("Therapist is thinking..."):
+            try:
+                reply, _ = generate_reply(
+                    st.session_state.chat_history,
+                    client=initialize_groq_client(),
+                    **reply_options
+                )
+
+            except Exception as e:
+                st.error(f"Groq API Error: {e}")
+                reply = get_free_ai_response(user_input, st.session_state.chat_history)
 
     # Add assistant reply to chat history
     st.session_state.chat_history.append(("assistant", reply))
     
-    # Save chat history
-    save_chat_history(st.session_state.chat_history)
+    # Save the new exchange
+    append_chat_messages([("user", user_input), ("assistant", reply)])
+    update_chat_summary(system_prompt, summary_state)
 
-    # Text-to-speech for bot response
+    # Text-to-speech for bot response; plays in the background and
+    # interrupts this session's previous reply
     if st.session_state.tts_enabled:
-        with st.spinner("🔊 Speaking response..."):
-            speak_text(reply, st.session_state.last_detected_emotion)
+        speak_text(reply, st.session_state.last_detected_emotion)
+
+    st.rerun()
+
+def summarize_messages(previous_summary, messages, client=None, session_key=None, deadline=None):
+    """Fold chat messages into the running conversation summary
+
+    deadline is a time.monotonic() value the whole call, quota waits and
+    retries included, must finish by; TimeoutError is raised otherwise.
+    """
+    transcript = "\n".join(
+        f"{'User' if role == 'user' else 'Therapist'}: {message}" for role, message in messages
+    )
+    prompt = [
+        {
+            "role": "system",
+            "content": (
+                "You maintain a short running summary of a therapy conversation. "
+                "Update the summary with the new messages. Keep what matters for "
+                "future replies: the user's situation, feelings, people and events "
+                "they mentioned, and advice already given. Write in the language "
+                "the user uses. Reply with the summary only, under 200 words."
+            )
+        },
+        {
+            "role": "user",
+            "content": f"Current summary:\n{previous_summary or '(none)'}\n\nNew messages:\n{transcript}"
+        }
+    ]
+    client = client or initialize_groq_client()
+    
+    def remaining():
+        return None if deadline is None else deadline - time.monotonic()
+    
+    def create():
+        timeout = remaining()
+        if timeout is not None and timeout <= 0:
+            raise TimeoutError("Summary deadline passed")
+        options = {} if timeout is None else {"timeout": timeout}
+        return client.chat.completions.create(
+            model=SUMMARY_MODEL,
+            messages=prompt,
+            temperature=0.3,
+            max_tokens=SUMMARY_MAX_TOKENS,
+            **options
+        )
+    
+    completion = call_with_retry(
+        create,
+        tokens=estimate_request_tokens(prompt, SUMMARY_MAX_TOKENS),
+        key=session_key,
+        timeout=remaining()
+    )
+    return completion.choices[0].message.content
+
+def _fold_summary(user_id, history, offset, summary_state, system_prompt, client, session_key):
+    """Run one summary fold for a user on a summary worker thread"""
+    deadline = time.monotonic() + SUMMARY_DEADLINE
+    
+    def summarize(previous_summary, messages):
+        return summarize_messages(previous_summary, messages, client, session_key, deadline)
+    
+    try:
+        new_state = fold_history(history, offset, summary_state, system_prompt, summarize)
+        if new_state:
+            with use_user(user_id):
+                # Keep a summary another fold wrote meanwhile; save_chat_summary
+                # refuses a summary of a history cleared meanwhile
+                if load_chat_summary()["covered"] == summary_state["covered"]:
+                    save_chat_summary(new_state["summary"], new_state["covered"], summary_state.get("history_id"))
+    except Exception as e:
+        # Older turns are simply left out of the prompt until the next attempt
+        logger.warning("Could not update conversation summary: %s", e)
+    finally:
+        with _summary_lock:
+            _summary_folds.pop(user_id, None)
+
+def update_chat_summary(system_prompt, summary_state):
+    """Fold older turns into the stored summary once they overflow the context budget
 
-    st.rerun()
\ No newline at end of file
+    The fold calls the LLM, so it runs in the background within
+    SUMMARY_DEADLINE; later replies pick up the stored summary once it is
+    written.
+    """
+    history = list(st.session_state.chat_history)
+    offset = st.session_state.get("chat_history_offset", 0)
+    if messages_to_fold(history, offset, summary_state, system_prompt) is None:
+        return
+    
+    client = initialize_groq_client()
+    user_id = current_user_id()
+    with _summary_lock:
+        if user_id in _summary_folds:
+            # The running fold's turns are folded again on the next reply if still needed
+            return
+        _summary_folds[user_id] = _summary_executor.submit(
+            _fold_summary,
+            user_id,
+            history,
+            offset,
+            summary_state,
+            system_prompt,
+            client,
+            rate_limit_key()
+        )
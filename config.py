@@ -1,6 +1,50 @@
 import streamlit as st
 import os
-from groq import Groq
+import json
+import threading
+import time
+
+# Storage backend used by chat_memory: "json" (default) or "sqlite"
+STORAGE_BACKEND = os.getenv("MIND_MIRROR_STORAGE", "json").lower()
+# SQLite database file name inside each user's data directory
+SQLITE_DB_NAME = os.getenv("MIND_MIRROR_DB", "mind_mirror.db")
+
+# Retention per dataset. max_count and max_age_days bound the raw data kept.
+# Raw data older than downsample_older_than_days is dropped once it has been
+# folded into per-day rollups; rollups themselves only expire via max_age_days.
+# None disables a limit. Override with e.g.
+# MIND_MIRROR_RETENTION='{"chat": {"max_age_days": 365}}'
+RETENTION_POLICIES = {
+    "chat": {"max_count": 5000, "max_age_days": None, "downsample_older_than_days": None},
+    "emotions": {"max_count": 1000, "max_age_days": None, "downsample_older_than_days": None},
+    "session_emotions": {"max_count": 100},
+}
+for _dataset, _overrides in json.loads(os.getenv("MIND_MIRROR_RETENTION", "{}")).items():
+    RETENTION_POLICIES.setdefault(_dataset, {}).update(_overrides)
+
+# Seconds between background retention passes over recently written data
+RETENTION_INTERVAL = float(os.getenv("MIND_MIRROR_RETENTION_INTERVAL", 300))
+
+# Groq HTTP client: one pooled client is shared by every session
+GROQ_TIMEOUT = float(os.getenv("MIND_MIRROR_GROQ_TIMEOUT", 30))
+GROQ_CONNECT_TIMEOUT = float(os.getenv("MIND_MIRROR_GROQ_CONNECT_TIMEOUT", 5))
+GROQ_MAX_CONNECTIONS = int(os.getenv("MIND_MIRROR_GROQ_MAX_CONNECTIONS", 20))
+GROQ_MAX_KEEPALIVE = int(os.getenv("MIND_MIRROR_GROQ_MAX_KEEPALIVE", 10))
+GROQ_KEEPALIVE_EXPIRY = float(os.getenv("MIND_MIRROR_GROQ_KEEPALIVE_EXPIRY", 60))
+# Chat requests are retried by rate_limiter across sessions, not by the SDK
+GROQ_MAX_RETRIES = int(os.getenv("MIND_MIRROR_GROQ_MAX_RETRIES", 0))
+
+_groq_client = None
+_groq_client_key = None
+_groq_client_lock = threading.Lock()
+
+# Data for sessions without a ?user= query parameter: "browser" (default)
+# gives each browser its own random id, kept in the page URL so reloads and
+# bookmarks find the same history; "session" gives every browser session a
+# new id; "shared" keeps one history for everyone who opens the app.
+# ?user= only selects whose data is shown, it is not access control: anyone
+# who knows or guesses an id can read that history.
+ANONYMOUS_USER_MODE = os.getenv("MIND_MIRROR_ANONYMOUS_USERS", "browser").lower()
 
 def initialize_app():
     """Initialize app configuration and API clients"""
@@ -14,6 +58,8 @@ def initialize_app():
         st.session_state.last_detected_emotion = None
     if "voice_mode" not in st.session_state:
         st.session_state.voice_mode = False
+    if "stream_replies" not in st.session_state:
+        st.session_state.stream_replies = True
     if "mood_history" not in st.session_state:
         st.session_state.mood_history = []
 
@@ -29,12 +75,61 @@ def initialize_groq_client():
     
     # Initialize Groq client only if API key exists
     try:
-        client = Groq(api_key=GROQ_API_KEY)
-        return client
+        return get_groq_client(GROQ_API_KEY)
     except Exception as e:
         st.error(f"Failed to initialize Groq client: {e}")
         st.stop()
 
+def get_groq_client(api_key):
+    """Get the process-wide Groq client, creating it on first use
+
+    The client keeps its HTTP connections alive, so consecutive requests from
+    any session reuse warm connections instead of a new TLS handshake each.
+    """
+    global _groq_client, _groq_client_key
+    with _groq_client_lock:
+        if _groq_client is None or _groq_client_key != api_key:
+            import httpx
+            from groq import Groq
+            
+            _groq_client = Groq(
+                api_key=api_key,
+                max_retries=GROQ_MAX_RETRIES,
+                http_client=httpx.Client(
+                    timeout=httpx.Timeout(GROQ_TIMEOUT, connect=GROQ_CONNECT_TIMEOUT),
+                    limits=httpx.Limits(
+                        max_connections=GROQ_MAX_CONNECTIONS,
+                        max_keepalive_connections=GROQ_MAX_KEEPALIVE,
+                        keepalive_expiry=GROQ_KEEPALIVE_EXPIRY
+                    )
+                )
+            )
+            _groq_client_key = api_key
+        return _groq_client
+
+def reset_groq_client():
+    """Drop the shared Groq client so the next request builds a fresh one"""
+    global _groq_client, _groq_client_key
+    with _groq_client_lock:
+        # Not closed here: other sessions may still be mid-request on it, and
+        # its connections are released when it is garbage collected
+        _groq_client = _groq_client_key = None
+
+def check_groq_health():
+    """Make a cheap request with the shared client
+
+    Returns (ok, latency in ms, error message). A failed check resets the
+    client, since its pooled connections may be broken.
+    """
+    start = time.perf_counter()
+    try:
+        client = get_groq_client(os.getenv("GROQ_API_KEY"))
+        client.with_options(max_retries=0, timeout=GROQ_CONNECT_TIMEOUT * 2).models.list()
+        return True, (time.perf_counter() - start) * 1000, None
+    except Exception as e:
+        reset_groq_client()
+        return False, (time.perf_counter() - start) * 1000, str(e)
+
 def get_language_settings():
     """Get current language settings from session state"""
     language = st.session_state.get('language', 'english')
@@ -0,0 +1,148 @@
+import json
+import zipfile
+from datetime import datetime
+
+import chat_memory
+
+# Archive layout (zip, deflate-compressed):
+#   manifest.json          format version, export time and record counts
+#   chat_history.jsonl     one {"role", "content", "ts"} record per line
+#   emotions.jsonl         one {"emotion", "timestamp", "date"} record per line
+#   emotion_rollups.json   {date: {emotion: count}}
+#   chat_rollups.json      {date: {role: count, "<role>_chars": chars}} of
+#                          messages removed by retention (added in 2.1)
+#   user_preferences.json  preferences dict
+ARCHIVE_VERSION = "2.1"
+
+# Records buffered per write/append during export and import
+BATCH_SIZE = 500
+
+def _write_jsonl(archive, name, records):
+    """Stream records into an archive member, one JSON document per line"""
+    count = 0
+    with archive.open(name, 'w', force_zip64=True) as member:
+        batch = []
+        for record in records:
+            batch.append(json.dumps(record, ensure_ascii=False))
+            if len(batch) >= BATCH_SIZE:
+                member.write(("\n".join(batch) + "\n").encode('utf-8'))
+                count += len(batch)
+                batch = []
+        if batch:
+            member.write(("\n".join(batch) + "\n").encode('utf-8'))
+            count += len(batch)
+    return count
+
+def _read_jsonl(archive, name):
+    """Yield the records of an archive member line by line"""
+    with archive.open(name) as member:
+        for line in member:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+def _batched(records):
+    """Group an iterable into lists of BATCH_SIZE"""
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) >= BATCH_SIZE:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+def export_archive(path):
+    """Write all stored data to a zip archive at path"""
+    with zipfile.ZipFile(path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        counts = {
+            'chat_history': _write_jsonl(archive, 'chat_history.jsonl', chat_memory.iter_chat_records()),
+            'emotions': _write_jsonl(archive, 'emotions.jsonl', chat_memory.iter_emotion_data()),
+        }
+
+        rollups = chat_memory.load_emotion_rollups()
+        archive.writestr('emotion_rollups.json', json.dumps(rollups, ensure_ascii=False))
+        counts['emotion_rollups'] = len(rollups)
+
+        chat_rollups = chat_memory.load_chat_rollups()
+        archive.writestr('chat_rollups.json', json.dumps(chat_rollups, ensure_ascii=False))
+        counts['chat_rollups'] = len(chat_rollups)
+
+        preferences = chat_memory.load_user_preferences()
+        archive.writestr('user_preferences.json', json.dumps(preferences, ensure_ascii=False))
+        counts['user_preferences'] = len(preferences)
+
+        # Written last so the record counts are known
+        archive.writestr('manifest.json', json.dumps({
+            'version': ARCHIVE_VERSION,
+            'export_timestamp': datetime.now().isoformat(),
+            'records': counts
+        }, indent=2))
+    return counts
+
+def import_archive(path):
+    """Stream an archive written by export_archive back into storage
+
+    Legacy single-file JSON exports (version 1.0) are also accepted.
+    Returns the number of records imported per dataset.
+    """
+    if not zipfile.is_zipfile(path):
+        return _import_legacy_json(path)
+
+    counts = {'chat_history': 0, 'emotions': 0, 'emotion_rollups': 0, 'chat_rollups': 0, 'user_preferences': 0}
+    with zipfile.ZipFile(path) as archive:
+        manifest = json.loads(archive.read('manifest.json'))
+        if manifest.get('version', '').split('.')[0] != ARCHIVE_VERSION.split('.')[0]:
+            raise ValueError(f"Unsupported export version: {manifest.get('version')}")
+
+        for batch in _batched(_read_jsonl(archive, 'chat_history.jsonl')):
+            chat_memory.append_chat_records(batch)
+            counts['chat_history'] += len(batch)
+
+        # Messages removed by retention before the export only survive as
+        # rollups; 2.0 archives predate them
+        if 'chat_rollups.json' in archive.namelist():
+            chat_rollups = json.loads(archive.read('chat_rollups.json'))
+            chat_memory.merge_chat_rollups(chat_rollups)
+            counts['chat_rollups'] = len(chat_rollups)
+
+        # Raw entries may have been trimmed before export, so the exported
+        # rollups (not the raw entries) carry the long-term counts. They are
+        # merged first so existing raw data is rolled up without the import.
+        rollups = json.loads(archive.read('emotion_rollups.json'))
+        chat_memory.merge_emotion_rollups(rollups)
+        counts['emotion_rollups'] = len(rollups)
+
+        for batch in _batched(_read_jsonl(archive, 'emotions.jsonl')):
+            chat_memory.import_emotion_entries(batch, update_rollups=False)
+            counts['emotions'] += len(batch)
+
+        preferences = json.loads(archive.read('user_preferences.json'))
+        if preferences:
+            chat_memory.save_user_preferences(preferences)
+        counts['user_preferences'] = len(preferences)
+
+    return counts
+
+def _import_legacy_json(path):
+    """Import a version 1.0 single-file JSON export"""
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    messages = data.get('chat_history', [])
+    chat_memory.append_chat_records([{'role': role, 'content': message} for role, message in messages])
+
+    emotions = data.get('emotion_data', [])
+    chat_memory.import_emotion_entries(emotions)
+
+    preferences = data.get('user_preferences', {})
+    if preferences:
+        chat_memory.save_user_preferences(preferences)
+
+    return {
+        'chat_history': len(messages),
+        'emotions': len(emotions),
+        'emotion_rollups': 0,
+        'chat_rollups': 0,
+        'user_preferences': len(preferences)
+    }
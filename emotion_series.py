@@ -0,0 +1,262 @@
+import array
+import bisect
+import json
+import mmap
+import os
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+
+# On disk a series is three files next to each other:
+#   <base>.ts         int64 epoch seconds, one per entry (native byte order)
+#   <base>.codes      uint8 emotion code, one per entry
+#   <base>.meta.json  {"codes": [emotion names by code], "sorted": bool}
+# Both data files are append-only, so adding entries never rewrites history.
+
+MAX_CODES = 256
+
+def _to_epoch(timestamp):
+    """Epoch seconds for a datetime, ISO string or number"""
+    if isinstance(timestamp, str):
+        timestamp = datetime.fromisoformat(timestamp)
+    if isinstance(timestamp, datetime):
+        return int(timestamp.timestamp())
+    return int(timestamp)
+
+class EmotionSeries:
+    """Emotion entries stored column-wise as epoch seconds plus a small-int
+    emotion code, instead of one dict of strings per entry.
+
+    The columns are either arrays (in-memory series) or memoryviews over a
+    memory-mapped file (see open_series); slicing never copies.
+    """
+
+    def __init__(self, code_table=None, timestamps=None, codes=None, is_sorted=True):
+        self.code_table = list(code_table or [])
+        self._code_index = {emotion: code for code, emotion in enumerate(self.code_table)}
+        self.timestamps = timestamps if timestamps is not None else array.array('q')
+        self.codes = codes if codes is not None else array.array('B')
+        self.is_sorted = is_sorted
+
+    def __len__(self):
+        return min(len(self.timestamps), len(self.codes))
+
+    def code_for(self, emotion):
+        """Code of an emotion, adding it to the code table if new"""
+        code = self._code_index.get(emotion)
+        if code is None:
+            if len(self.code_table) >= MAX_CODES:
+                raise ValueError("Too many distinct emotions for a one-byte code")
+            code = len(self.code_table)
+            self.code_table.append(emotion)
+            self._code_index[emotion] = code
+        return code
+
+    def append(self, emotion, timestamp):
+        """Add one entry (in-memory series only)"""
+        epoch = _to_epoch(timestamp)
+        if len(self) and epoch < self.timestamps[len(self) - 1]:
+            self.is_sorted = False
+        self.timestamps.append(epoch)
+        self.codes.append(self.code_for(emotion))
+
+    def _new(self, timestamps, codes, is_sorted):
+        return EmotionSeries(self.code_table, timestamps, codes, is_sorted)
+
+    def tail(self, count):
+        """The newest `count` entries"""
+        n = len(self)
+        start = max(n - count, 0)
+        return self._new(self.timestamps[start:n], self.codes[start:n], self.is_sorted)
+
+    def between(self, start=None, end=None):
+        """Entries with start <= timestamp < end (datetimes or epoch seconds)"""
+        start = None if start is None else _to_epoch(start)
+        end = None if end is None else _to_epoch(end)
+        n = len(self)
+
+        if self.is_sorted:
+            timestamps = self.timestamps[:n]
+            lo = 0 if start is None else bisect.bisect_left(timestamps, start)
+            hi = n if end is None else bisect.bisect_left(timestamps, end)
+            return self._new(self.timestamps[lo:hi], self.codes[lo:hi], True)
+
+        selected = [
+            i for i in range(n)
+            if (start is None or self.timestamps[i] >= start) and (end is None or self.timestamps[i] < end)
+        ]
+        return self._new(
+            array.array('q', (self.timestamps[i] for i in selected)),
+            array.array('B', (self.codes[i] for i in selected)),
+            False
+        )
+
+    def counts(self):
+        """{emotion: count} over the series"""
+        return {self.code_table[code]: count for code, count in Counter(self.codes[:len(self)]).items()}
+
+    def daily_counts(self):
+        """{ISO date: {emotion: count}} over the series"""
+        days = {}
+        for epoch, code in zip(self.timestamps, self.codes):
+            date = datetime.fromtimestamp(epoch).date().isoformat()
+            counts = days.setdefault(date, {})
+            emotion = self.code_table[code]
+            counts[emotion] = counts.get(emotion, 0) + 1
+        return days
+
+    def entries(self):
+        """Yield entries in the dict format used by chat_memory"""
+        for epoch, code in zip(self.timestamps, self.codes):
+            moment = datetime.fromtimestamp(epoch)
+            yield {
+                'emotion': self.code_table[code],
+                'timestamp': moment.isoformat(),
+                'date': moment.date().isoformat()
+            }
+
+# File-backed series
+def _paths(base):
+    return f"{base}.ts", f"{base}.codes", f"{base}.meta.json"
+
+def _read_meta(base):
+    meta_path = _paths(base)[2]
+    if not os.path.exists(meta_path):
+        return {'codes': [], 'sorted': True}
+    with open(meta_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def _write_meta(base, code_table, is_sorted):
+    meta_path = _paths(base)[2]
+    tmp_path = f"{meta_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'codes': code_table, 'sorted': is_sorted}, f, ensure_ascii=False)
+    os.replace(tmp_path, meta_path)
+
+def _entry_count(base):
+    ts_path, codes_path, _ = _paths(base)
+    if not os.path.exists(ts_path) or not os.path.exists(codes_path):
+        return 0
+    # A crash between the two appends can leave one column longer
+    return min(os.path.getsize(ts_path) // 8, os.path.getsize(codes_path))
+
+def exists(base):
+    """Whether a series has been written at base"""
+    return os.path.exists(_paths(base)[2])
+
+def count(base):
+    """Number of entries stored at base"""
+    return _entry_count(base)
+
+def append_entries(base, entries):
+    """Append entries (dicts with 'emotion' and 'timestamp') to the series at base"""
+    entries = list(entries)
+    if not entries and exists(base):
+        return
+
+    directory = os.path.dirname(base)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    ts_path, codes_path, _ = _paths(base)
+
+    meta = _read_meta(base)
+    series = EmotionSeries(meta['codes'], is_sorted=meta['sorted'])
+    known_codes = len(series.code_table)
+
+    n = _entry_count(base)
+    last = None
+    if n:
+        with open(ts_path, 'rb') as f:
+            f.seek((n - 1) * 8)
+            last = array.array('q', f.read(8))[0]
+
+    timestamps = array.array('q')
+    codes = array.array('B')
+    for entry in entries:
+        epoch = _to_epoch(entry['timestamp'])
+        if last is not None and epoch < last:
+            series.is_sorted = False
+        last = epoch
+        timestamps.append(epoch)
+        codes.append(series.code_for(entry['emotion']))
+
+    if len(series.code_table) != known_codes or series.is_sorted != meta['sorted'] or not exists(base):
+        _write_meta(base, series.code_table, series.is_sorted)
+
+    # Drop any torn tail so both columns line up before appending
+    for path, width in ((codes_path, 1), (ts_path, 8)):
+        with open(path, 'ab') as f:
+            if f.tell() != n * width:
+                f.truncate(n * width)
+    with open(codes_path, 'ab') as f:
+        codes.tofile(f)
+    with open(ts_path, 'ab') as f:
+        timestamps.tofile(f)
+
+def write_series(base, series):
+    """Replace the series at base with the given one"""
+    directory = os.path.dirname(base)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    ts_path, codes_path, _ = _paths(base)
+
+    n = len(series)
+    for path, column, typecode in ((ts_path, series.timestamps, 'q'), (codes_path, series.codes, 'B')):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            array.array(typecode, column[:n]).tofile(f)
+        os.replace(tmp_path, path)
+    _write_meta(base, series.code_table, series.is_sorted)
+
+def remove(base):
+    """Delete the series at base"""
+    for path in _paths(base):
+        if os.path.exists(path):
+            os.remove(path)
+
+@contextmanager
+def open_series(base):
+    """Memory-map the series at base as a read-only EmotionSeries
+
+    Columns are views into the mapped files, valid only inside the block.
+    """
+    meta = _read_meta(base)
+    n = _entry_count(base)
+    if n == 0:
+        yield EmotionSeries(meta['codes'], is_sorted=meta['sorted'])
+        return
+
+    ts_path, codes_path, _ = _paths(base)
+    with open(ts_path, 'rb') as ts_file, open(codes_path, 'rb') as codes_file:
+        ts_map = mmap.mmap(ts_file.fileno(), n * 8, access=mmap.ACCESS_READ)
+        codes_map = mmap.mmap(codes_file.fileno(), n, access=mmap.ACCESS_READ)
+        ts_view = memoryview(ts_map).cast('q')
+        codes_view = memoryview(codes_map)
+        series = EmotionSeries(meta['codes'], ts_view, codes_view, meta['sorted'])
+        try:
+            yield series
+        finally:
+            series.timestamps = series.codes = None
+            ts_view.release()
+            codes_view.release()
+            try:
+                ts_map.close()
+                codes_map.close()
+            except BufferError:
+                # A caller still holds a slice; the maps close once it is collected
+                pass
+
+def load_series(base, start=None, end=None):
+    """Copy the entries of the series at base (optionally a time range) into memory"""
+    with open_series(base) as series:
+        selected = series.between(start, end)
+        result = EmotionSeries(
+            selected.code_table,
+            array.array('q', selected.timestamps),
+            array.array('B', selected.codes),
+            selected.is_sorted
+        )
+        if isinstance(selected.timestamps, memoryview):
+            selected.timestamps.release()
+            selected.codes.release()
+        return result
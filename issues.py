@@ -2,6 +2,9 @@ import streamlit as st
 import datetime
 import json
 import os
+import rate_limiter
+import response_cache
+import tts_cache
 
 def render_issues_page():
     """Render the issues and support page"""
@@ -203,6 +206,20 @@ def render_system_info():
         st.markdown("#### 🌐 Environment")
         st.write(f"**API Key Status:** {'✅ Configured' if os.getenv('GROQ_API_KEY') else '❌ Missing'}")
         
+        stats = response_cache.cache_stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = f"{stats['hits'] / lookups:.0%}" if lookups else "n/a"
+        st.write(f"**Response Cache:** {stats['entries']}/{stats['max_entries']} entries, {hit_rate} hit rate")
+        
+        speech = tts_cache.cache_stats()
+        speech_hits = speech["hits"] + speech["disk_hits"]
+        lookups = speech_hits + speech["misses"]
+        hit_rate = f"{speech_hits / lookups:.0%}" if lookups else "n/a"
+        st.write(f"**Speech Cache:** {speech['disk_entries']} clips, {speech['disk_mb']}/{speech['max_disk_mb']} MB on disk, {hit_rate} hit rate")
+        
+        limits = rate_limiter.groq_limiter.stats()
+        st.write(f"**Groq Quota:** {limits['requests_available']:.0f} requests, {limits['tokens_available']} tokens available, {limits['waiting']} waiting")
+        
         # Check file permissions
         files_to_check = ['.env', 'images/logo.png', 'images/user.jpg', 'images/bot.jpg']
         st.markdown("#### 📁 File Status")
@@ -251,9 +268,15 @@ def save_issue_report(issue_type, data):
 def test_api_connection():
     """Test the API connection"""
     try:
-        from config import initialize_groq_client
+        from config import initialize_groq_client, check_groq_health
         client = initialize_groq_client()
         
+        healthy, latency_ms, error = check_groq_health()
+        if not healthy:
+            st.error(f"❌ API connection failed: {error}")
+            return
+        st.info(f"Connection check took {latency_ms:.0f} ms")
+        
         # Test with a simple message
         completion = client.chat.completions.create(
             model="llama3-70b-8192",
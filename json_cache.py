@@ -0,0 +1,74 @@
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Upper bound on the size (as measured on disk) of all cached files
+MAX_CACHE_BYTES = int(os.getenv("MIND_MIRROR_CACHE_BYTES", 32 * 1024 * 1024))
+
+# path -> (mtime_ns, size, value), least recently used first
+_entries = OrderedDict()
+_total_bytes = 0
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+def _parse_json(f):
+    """Decode the whole file as JSON"""
+    return json.load(f)
+
+def load_cached(path, parser=_parse_json):
+    """Return the parsed contents of a file, reusing the cached copy while
+    the file's mtime and size are unchanged.
+
+    parser receives the open text file. The returned object is shared
+    between callers and must not be mutated.
+    """
+    global _total_bytes
+
+    stat = os.stat(path)
+    validator = (stat.st_mtime_ns, stat.st_size)
+
+    with _lock:
+        entry = _entries.get(path)
+        if entry is not None and entry[:2] == validator:
+            _entries.move_to_end(path)
+            _stats["hits"] += 1
+            return entry[2]
+        _stats["misses"] += 1
+
+    with open(path, 'r', encoding='utf-8') as f:
+        value = parser(f)
+
+    if stat.st_size > MAX_CACHE_BYTES:
+        return value
+
+    with _lock:
+        old = _entries.pop(path, None)
+        if old is not None:
+            _total_bytes -= old[1]
+        _entries[path] = (validator[0], validator[1], value)
+        _total_bytes += stat.st_size
+
+        while _total_bytes > MAX_CACHE_BYTES and _entries:
+            _, (_, size, _) = _entries.popitem(last=False)
+            _total_bytes -= size
+            _stats["evictions"] += 1
+
+    return value
+
+def invalidate(path=None):
+    """Drop a file (or everything when path is None) from the cache"""
+    global _total_bytes
+    with _lock:
+        if path is None:
+            _entries.clear()
+            _total_bytes = 0
+            return
+        entry = _entries.pop(path, None)
+        if entry is not None:
+            _total_bytes -= entry[1]
+
+def cache_stats():
+    """Hit/miss counters and current memory use of the cache"""
+    with _lock:
+        return dict(_stats, entries=len(_entries), bytes=_total_bytes, max_bytes=MAX_CACHE_BYTES)
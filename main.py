@@ -2,11 +2,7 @@ import streamlit as st
 from dotenv import load_dotenv
 from config import initialize_app
 from ui_components import setup_custom_styles, setup_sidebar, load_avatars
-from chat_page import render_chat_page
-from mood_tracker import render_mood_tracker
-from journal_page import render_journal_page
-from progress_page import render_progress_page
-from voice_analytics import render_voice_analytics
+from chat_memory import resolve_user_id
 
 def main():
     """Main application function"""
@@ -16,6 +12,9 @@ def main():
     # Initialize app configuration
     initialize_app()
     
+    # Resolve whose data this session reads and writes
+    resolve_user_id()
+    
     # Setup custom styles
     setup_custom_styles()
     
@@ -25,16 +24,21 @@ def main():
     # Setup sidebar and get navigation choice
     choice = setup_sidebar()
     
-    # Route to appropriate page
+    # Route to appropriate page, importing only the page that is shown
     if choice == "Chat":
+        from chat_page import render_chat_page
         render_chat_page()
     elif choice == "Mood Tracker":
+        from mood_tracker import render_mood_tracker
         render_mood_tracker()
     elif choice == "Journal":
+        from journal_page import render_journal_page
         render_journal_page()
     elif choice == "Progress":
+        from progress_page import render_progress_page
         render_progress_page()
     elif choice == "Voice Analytics":
+        from voice_analytics import render_voice_analytics
         render_voice_analytics()
 
 if __name__ == "__main__":
@@ -0,0 +1,148 @@
+import logging
+import os
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ai_responses import get_fallback_response
+
+logger = logging.getLogger(__name__)
+
+# Seconds without any output from the running providers before the next
+# provider is started alongside them (None disables hedging)
+HEDGE_AFTER = os.getenv("MIND_MIRROR_HEDGE_AFTER", "4")
+HEDGE_AFTER = float(HEDGE_AFTER) if HEDGE_AFTER.lower() not in ("", "none", "off") else None
+
+# Hard limit on the time to a complete reply, across all providers
+REPLY_SLA = float(os.getenv("MIND_MIRROR_REPLY_SLA", 30))
+
+# Seconds each provider gets to finish a reply
+GROQ_DEADLINE = float(os.getenv("MIND_MIRROR_GROQ_DEADLINE", 20))
+HF_DEADLINE = float(os.getenv("MIND_MIRROR_HF_DEADLINE", 15))
+
+# Provider calls run on these threads so the script thread can keep its
+# deadlines; a call abandoned after its deadline finishes in the background
+_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="provider")
+
+class Provider:
+    """A source of replies for route()
+
+    call(cancel, emit) produces the reply, passing each new piece of text to
+    emit as it arrives (once with the whole text for non-streaming
+    providers). It should stop early once the cancel event is set.
+    deadline is the most seconds the provider gets to finish.
+    """
+
+    def __init__(self, name, call, deadline):
+        self.name = name
+        self.call = call
+        self.deadline = deadline
+
+def _run(provider, cancel, events):
+    # Events carry the cancel event so output of an earlier, cancelled run
+    # of the same provider is not mistaken for the current one
+    try:
+        provider.call(cancel, lambda text: events.put((provider.name, cancel, "text", text)))
+        events.put((provider.name, cancel, "done", None))
+    except Exception as e:
+        events.put((provider.name, cancel, "error", e))
+
+def route(providers, hedge_after=HEDGE_AFTER, sla=REPLY_SLA, on_text=None):
+    """Get a reply from the first provider that answers, in priority order
+
+    The first provider starts immediately. The next one starts when every
+    running provider has failed or timed out, or, as a hedge, when none has
+    produced output for hedge_after seconds. The first provider to produce
+    text wins and the others are cancelled. on_text(text so far) is called
+    on the calling thread as the winner's reply grows.
+
+    Only a reply its provider finished is returned. If the winner fails or
+    times out midway, its text is discarded, the cancelled and remaining
+    providers are tried again in priority order and on_text starts over.
+
+    Returns (reply, provider name). When no provider answers within the SLA
+    a canned reply from get_fallback_response is returned as "fallback".
+    """
+    events = queue.Queue()
+    start = time.monotonic()
+    sla_at = start + sla
+    pending = list(providers)
+    running = {}  # name -> (provider, cancel event, deadline)
+    winner = None
+    completed = False
+    text = ""
+
+    def launch():
+        provider = pending.pop(0)
+        cancel = threading.Event()
+        running[provider.name] = (provider, cancel, min(time.monotonic() + provider.deadline, sla_at))
+        _executor.submit(_run, provider, cancel, events)
+
+    def drop(name, reason):
+        _, cancel, _ = running.pop(name)
+        cancel.set()
+        if reason:
+            logger.warning("Provider %s %s after %.1fs", name, reason, time.monotonic() - start)
+
+    launch()
+    next_hedge = start + hedge_after if hedge_after is not None else None
+
+    while running or (winner is None and pending and time.monotonic() < sla_at):
+        now = time.monotonic()
+        for name, (_, _, deadline) in list(running.items()):
+            if now >= deadline:
+                drop(name, "timed out")
+                if name == winner:
+                    winner, text = None, ""
+
+        if winner is None and pending and now < sla_at and (
+                not running or (next_hedge is not None and now >= next_hedge)):
+            launch()
+            if hedge_after is not None:
+                next_hedge = time.monotonic() + hedge_after
+            continue
+        if not running:
+            break
+
+        wake_times = [deadline for _, _, deadline in running.values()]
+        if winner is None and pending and next_hedge is not None:
+            wake_times.append(next_hedge)
+        try:
+            name, cancel, kind, payload = events.get(timeout=max(min(wake_times) - now, 0))
+        except queue.Empty:
+            continue
+        if name not in running or running[name][1] is not cancel:
+            # Output from a provider run that was already cancelled
+            continue
+
+        if kind == "text" and payload:
+            if winner is None:
+                winner = name
+                others = [other for other in running if other != name]
+                for other in others:
+                    drop(other, "")
+                # Kept in priority order in case the winner fails midway
+                pending[:] = [p for p in providers if p.name in others or p in pending]
+            text += payload
+            if on_text is not None:
+                on_text(text)
+        elif kind == "done":
+            running.pop(name)
+            if name == winner:
+                completed = True
+                break
+            if winner is None:
+                logger.warning("Provider %s returned no reply", name)
+        elif kind == "error":
+            running.pop(name)
+            if name == winner:
+                logger.warning("Provider %s failed midway through its reply: %s", name, payload)
+                winner, text = None, ""
+            else:
+                logger.warning("Provider %s failed: %s", name, payload)
+
+    reply = text.strip()
+    if not completed or not reply:
+        return get_fallback_response(), "fallback"
+    return reply, winner
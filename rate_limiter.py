@@ -0,0 +1,174 @@
+import logging
+import os
+import random
+import threading
+import time
+from collections import OrderedDict, deque
+
+logger = logging.getLogger(__name__)
+
+# Groq quota shared by every session of the process
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("MIND_MIRROR_GROQ_RPM", 30))
+GROQ_TOKENS_PER_MINUTE = float(os.getenv("MIND_MIRROR_GROQ_TPM", 6000))
+
+# Retries of rate-limited or failed calls, with jittered exponential backoff
+MAX_ATTEMPTS = int(os.getenv("MIND_MIRROR_GROQ_ATTEMPTS", 4))
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 20.0
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute, shared by all threads
+
+    Callers that have to wait are served round-robin by key (one key per
+    session), so a session sending many requests cannot starve the others.
+    After a 429 the whole limiter pauses, since every session shares the
+    quota that ran out.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.request_rate = requests_per_minute / 60.0
+        self.token_rate = tokens_per_minute / 60.0
+        self.request_capacity = max(requests_per_minute, 1)
+        self.token_capacity = max(tokens_per_minute, 1)
+        self._requests = self.request_capacity
+        self._tokens = self.token_capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._waiters = OrderedDict()  # key -> deque of waiting tickets, in turn order
+        self._cond = threading.Condition()
+        self._stats = {"granted": 0, "waited": 0, "timeouts": 0, "pauses": 0}
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        self._updated = now
+        self._requests = min(self.request_capacity, self._requests + elapsed * self.request_rate)
+        self._tokens = min(self.token_capacity, self._tokens + elapsed * self.token_rate)
+
+    def _wait_time(self, tokens, now):
+        """Seconds until a request of `tokens` fits, 0 if it fits now"""
+        tokens = min(tokens, self.token_capacity)
+        waits = [self._paused_until - now]
+        if self._requests < 1:
+            waits.append((1 - self._requests) / self.request_rate)
+        if self._tokens < tokens:
+            waits.append((tokens - self._tokens) / self.token_rate)
+        return max(max(waits), 0)
+
+    def _is_next(self, key, ticket):
+        first_key = next(iter(self._waiters))
+        return first_key == key and self._waiters[key][0] is ticket
+
+    def _leave(self, key, ticket, served):
+        queue = self._waiters[key]
+        queue.remove(ticket)
+        if not queue:
+            del self._waiters[key]
+        elif served:
+            # Other sessions go before this key's next request
+            self._waiters.move_to_end(key)
+        self._cond.notify_all()
+
+    def acquire(self, tokens=1, key=None, timeout=None, cancel=None):
+        """Wait for quota for one request using about `tokens` tokens
+
+        Returns False if timeout passes or the cancel event is set first.
+        """
+        ticket = object()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            self._waiters.setdefault(key, deque()).append(ticket)
+            waited = False
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                wait = self._wait_time(tokens, now) if self._is_next(key, ticket) else None
+                if wait == 0:
+                    self._requests -= 1
+                    self._tokens -= min(tokens, self.token_capacity)
+                    self._stats["granted"] += 1
+                    self._stats["waited"] += waited
+                    self._leave(key, ticket, served=True)
+                    return True
+                if (deadline is not None and now >= deadline) or (cancel is not None and cancel.is_set()):
+                    self._stats["timeouts"] += 1
+                    self._leave(key, ticket, served=False)
+                    return False
+                # Wake when quota should be available, polling for cancellation
+                limit = 0.5 if wait is None else min(wait, 0.5)
+                if deadline is not None:
+                    limit = min(limit, deadline - now)
+                waited = True
+                self._cond.wait(max(limit, 0.001))
+
+    def pause(self, seconds):
+        """Stop granting requests for `seconds`, e.g. after a 429"""
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._stats["pauses"] += 1
+
+    def stats(self):
+        """Counters and the quota currently available"""
+        with self._cond:
+            self._refill(time.monotonic())
+            return dict(
+                self._stats,
+                waiting=sum(len(queue) for queue in self._waiters.values()),
+                requests_available=round(self._requests, 1),
+                tokens_available=round(self._tokens)
+            )
+
+groq_limiter = RateLimiter(GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE)
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "response", None), "status_code", None)
+    return status
+
+def _retry_after(error):
+    """Seconds from the Retry-After header of a failed call, if any"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after")
+    try:
+        return max(float(value), 0) if value is not None else None
+    except ValueError:
+        return None
+
+def backoff_delay(attempt):
+    """Full-jitter exponential backoff for the given retry attempt (0-based)"""
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+
+def call_with_retry(func, tokens=1, key=None, limiter=None, timeout=None, cancel=None):
+    """Call func() within the rate limit, retrying rate limits and server errors
+
+    A Retry-After header is honoured when present, otherwise the delay is a
+    jittered exponential backoff. Raises TimeoutError when no quota frees up
+    within timeout, and the last error once the attempts are used up.
+    """
+    limiter = limiter or groq_limiter
+    deadline = None if timeout is None else time.monotonic() + timeout
+    for attempt in range(MAX_ATTEMPTS):
+        remaining = None if deadline is None else deadline - time.monotonic()
+        if not limiter.acquire(tokens, key, timeout=remaining, cancel=cancel):
+            raise TimeoutError("Timed out waiting for API quota")
+        try:
+            return func()
+        except Exception as e:
+            status = _status_code(e)
+            if status not in RETRY_STATUSES or attempt == MAX_ATTEMPTS - 1:
+                raise
+            delay = _retry_after(e)
+            if delay is None:
+                delay = backoff_delay(attempt)
+            logger.warning("API call failed with %s, retrying in %.1fs", status, delay)
+            if deadline is not None and time.monotonic() + delay >= deadline:
+                raise
+            if status == 429:
+                # The quota is shared, so every session waits, in acquire()
+                limiter.pause(delay)
+            elif cancel is not None:
+                if cancel.wait(delay):
+                    raise
+            else:
+                time.sleep(delay)
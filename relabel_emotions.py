@@ -0,0 +1,181 @@
+"""Label stored chat messages with emotions in bulk
+
+Emotions detected live from voice input are only kept in the session, so
+the stored chat history has no emotion entries of its own. This job streams the stored messages,
+classifies them in batches and writes the labels into the emotion store,
+timestamped with the message's own time.
+
+Progress is checkpointed per user after every batch, so an interrupted run
+resumes where it stopped (at most the batch in flight is labelled twice):
+
+    python relabel_emotions.py                      # default user, keyword engine
+    python relabel_emotions.py --all-users --batch-size 500
+    python relabel_emotions.py --engine llm --concurrency 4
+    python relabel_emotions.py --reset --purge      # start over from the first message
+
+Stored emotion entries do not record where they came from, so a run cannot
+tell its own labels from entries an earlier run or an import wrote.
+Starting over therefore has to delete all of the user's stored emotions
+(--purge), imported ones included, so earlier runs are not counted twice.
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import chat_memory
+from voice_chat_module import detect_emotion_from_text
+
+CHECKPOINT_FILE = "relabel_checkpoint.json"
+
+# Labels the LLM engine may return; anything else falls back to keywords
+EMOTIONS = ["happy", "sad", "angry", "anxious", "excited", "calm", "neutral"]
+LLM_MODEL = "llama3-8b-8192"
+
+def _checkpoint_path():
+    return os.path.join(chat_memory.user_data_dir(), CHECKPOINT_FILE)
+
+def load_checkpoint():
+    """Index of the next message to label for the current user"""
+    path = _checkpoint_path()
+    if not os.path.exists(path):
+        return 0
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f).get('next_index', 0)
+
+def save_checkpoint(next_index):
+    """Record progress atomically so a crash never leaves a torn checkpoint"""
+    path = _checkpoint_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'next_index': next_index,
+            'last_updated': datetime.now().isoformat()
+        }, f)
+    os.replace(tmp_path, path)
+
+def keyword_classifier():
+    """Classifier using the local keyword engine"""
+    return detect_emotion_from_text
+
+def llm_classifier():
+    """Classifier asking a small Groq model, falling back to keywords per message"""
+    from config import get_groq_client
+    from chat_context import message_tokens
+    from rate_limiter import call_with_retry
+
+    client = get_groq_client(os.getenv("GROQ_API_KEY"))
+    system_prompt = (
+        "Classify the emotion expressed in the user's message (English, Tamil or Tanglish). "
+        f"Answer with exactly one word from: {', '.join(EMOTIONS)}."
+    )
+
+    def classify(text):
+        try:
+            completion = call_with_retry(
+                lambda: client.chat.completions.create(
+                    model=LLM_MODEL,
+                    messages=[
+                        {"role": "system", "content": system_prompt},
+                        {"role": "user", "content": text}
+                    ],
+                    temperature=0,
+                    max_tokens=3
+                ),
+                tokens=message_tokens(system_prompt) + message_tokens(text) + 3,
+                key="relabel"
+            )
+            label = completion.choices[0].message.content.strip().lower().strip(".")
+            if label in EMOTIONS:
+                return label
+        except Exception as e:
+            print(f"  LLM classification failed, using keywords: {e}", file=sys.stderr)
+        return detect_emotion_from_text(text)
+
+    return classify
+
+def _timestamp(record):
+    """Time of a chat record, or now for records without one"""
+    try:
+        return datetime.fromisoformat(record['ts'])
+    except (KeyError, TypeError, ValueError):
+        return datetime.now()
+
+def relabel_user(classify, executor, roles, batch_size, reset=False):
+    """Label the current user's unlabelled messages; returns the number labelled
+
+    reset deletes the user's stored emotion entries and labels every
+    message from the first one.
+    """
+    if reset:
+        chat_memory.clear_emotion_data()
+        # An interrupted run resumes from the start, not from the old checkpoint
+        save_checkpoint(0)
+    start = 0 if reset else load_checkpoint()
+    labelled = 0
+    batch = []
+    next_index = start
+
+    def write(batch, next_index):
+        texts = [record['content'] for _, record in batch]
+        # map keeps the results in message order
+        labels = list(executor.map(classify, texts))
+        entries = []
+        for label, (_, record) in zip(labels, batch):
+            moment = _timestamp(record)
+            entries.append({'emotion': label, 'timestamp': moment.isoformat(), 'date': moment.date().isoformat()})
+        chat_memory.import_emotion_entries(entries)
+        save_checkpoint(next_index)
+        return len(batch)
+
+    for index, record in chat_memory.iter_indexed_chat_records(start):
+        next_index = index + 1
+        if record['role'] not in roles or not record['content'].strip():
+            continue
+        batch.append((index, record))
+        if len(batch) >= batch_size:
+            labelled += write(batch, next_index)
+            print(f"  {labelled} messages labelled (next index {next_index})")
+            batch = []
+
+    if batch:
+        labelled += write(batch, next_index)
+    save_checkpoint(next_index)
+    return labelled
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    users = parser.add_mutually_exclusive_group()
+    users.add_argument("--user", default=chat_memory.DEFAULT_USER_ID, help="user id to relabel")
+    users.add_argument("--all-users", action="store_true", help="relabel every user with stored data")
+    parser.add_argument("--engine", choices=["keyword", "llm"], default="keyword")
+    parser.add_argument("--batch-size", type=int, default=200, help="messages per write and checkpoint")
+    parser.add_argument("--concurrency", type=int, default=4, help="parallel LLM requests")
+    parser.add_argument("--roles", choices=["user", "all"], default="user",
+                        help="label only the user's messages, or the therapist's too")
+    parser.add_argument("--reset", action="store_true", help="ignore the checkpoint and start over (needs --purge)")
+    parser.add_argument("--purge", action="store_true",
+                        help="with --reset, delete the user's stored emotions first, imported ones included")
+    args = parser.parse_args()
+    if args.reset != args.purge:
+        parser.error("--reset and --purge go together: labels from earlier runs cannot be told apart, "
+                     "so starting over deletes all stored emotions first")
+
+    roles = {"user"} if args.roles == "user" else {"user", "assistant"}
+    classify = llm_classifier() if args.engine == "llm" else keyword_classifier()
+    user_ids = chat_memory.list_user_ids() if args.all_users else [args.user]
+
+    # The keyword engine is CPU-bound and gains nothing from threads
+    workers = args.concurrency if args.engine == "llm" else 1
+    with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+        for user_id in user_ids:
+            with chat_memory.use_user(user_id):
+                print(f"Relabelling {user_id}...")
+                labelled = relabel_user(classify, executor, roles, args.batch_size, args.reset)
+                print(f"{user_id}: {labelled} messages labelled")
+
+if __name__ == "__main__":
+    main()
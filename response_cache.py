@@ -0,0 +1,70 @@
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+# Completed LLM replies, shared by all sessions of the process
+MAX_ENTRIES = int(os.getenv("MIND_MIRROR_RESPONSE_CACHE_SIZE", 256))
+TTL_SECONDS = float(os.getenv("MIND_MIRROR_RESPONSE_CACHE_TTL", 600))
+
+# key -> (expires_at, reply), least recently used first
+_entries = OrderedDict()
+_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+_WHITESPACE = re.compile(r"\s+")
+
+def _normalize(text):
+    """Fold case and whitespace so trivially different prompts share a key"""
+    return _WHITESPACE.sub(" ", text).strip().casefold()
+
+def make_key(messages, **params):
+    """Cache key for a message list and the completion parameters"""
+    payload = {
+        "messages": [[message["role"], _normalize(message["content"])] for message in messages],
+        "params": params
+    }
+    encoded = json.dumps(payload, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def get(key):
+    """Cached reply for key, or None when missing or expired"""
+    with _lock:
+        entry = _entries.get(key)
+        if entry is not None:
+            if entry[0] > time.monotonic():
+                _entries.move_to_end(key)
+                _stats["hits"] += 1
+                return entry[1]
+            del _entries[key]
+            _stats["expired"] += 1
+        _stats["misses"] += 1
+        return None
+
+def put(key, reply, ttl=None):
+    """Store a reply, evicting the least recently used entries beyond MAX_ENTRIES"""
+    if MAX_ENTRIES <= 0:
+        return
+    expires_at = time.monotonic() + (TTL_SECONDS if ttl is None else ttl)
+    with _lock:
+        _entries[key] = (expires_at, reply)
+        _entries.move_to_end(key)
+        while len(_entries) > MAX_ENTRIES:
+            _entries.popitem(last=False)
+            _stats["evictions"] += 1
+
+def invalidate(key=None):
+    """Drop one entry (or everything when key is None)"""
+    with _lock:
+        if key is None:
+            _entries.clear()
+        else:
+            _entries.pop(key, None)
+
+def cache_stats():
+    """Hit/miss counters and current size of the cache"""
+    with _lock:
+        return dict(_stats, entries=len(_entries), max_entries=MAX_ENTRIES, ttl_seconds=TTL_SECONDS)
@@ -0,0 +1,400 @@
+import sqlite3
+import threading
+import json
+import os
+import uuid
+from collections import OrderedDict
+from datetime import datetime
+
+# One connection per (thread, database) since Streamlit runs each session's
+# script on its own thread and sqlite3 connections are thread-bound
+_local = threading.local()
+
+# Connections each thread keeps open. Background threads write to every
+# user's database in turn, so the least recently used ones are closed
+# rather than holding file descriptors for every user ever seen.
+MAX_CONNECTIONS_PER_THREAD = 8
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS messages (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    role TEXT NOT NULL,
+    content TEXT NOT NULL,
+    timestamp TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_messages_timestamp ON messages(timestamp);
+
+CREATE TABLE IF NOT EXISTS emotions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    emotion TEXT NOT NULL,
+    timestamp TEXT NOT NULL,
+    date TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_emotions_date ON emotions(date);
+CREATE INDEX IF NOT EXISTS idx_emotions_timestamp ON emotions(timestamp);
+
+-- Per-day emotion counts, maintained on every insert
+CREATE TABLE IF NOT EXISTS emotion_daily (
+    date TEXT NOT NULL,
+    emotion TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (date, emotion)
+);
+
+-- Per-day counts of chat messages removed by retention
+CREATE TABLE IF NOT EXISTS chat_daily (
+    date TEXT NOT NULL,
+    role TEXT NOT NULL,
+    count INTEGER NOT NULL,
+    chars INTEGER NOT NULL,
+    PRIMARY KEY (date, role)
+);
+
+-- Id of the current chat history, deleted with its messages so that a
+-- clear gives the history a new one
+CREATE TABLE IF NOT EXISTS chat_log (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    history_id TEXT NOT NULL
+);
+
+-- Rolling summary of every message with id <= covered
+CREATE TABLE IF NOT EXISTS chat_summary (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    summary TEXT NOT NULL,
+    covered INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS preferences (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+"""
+
+def get_connection(db_path):
+    """Get this thread's connection to the database, creating the schema on first use"""
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = OrderedDict()
+
+    conn = connections.get(db_path)
+    if conn is not None:
+        connections.move_to_end(db_path)
+    else:
+        directory = os.path.dirname(db_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        conn = sqlite3.connect(db_path, timeout=10)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.executescript(SCHEMA)
+        _backfill_emotion_daily(conn)
+        connections[db_path] = conn
+        while len(connections) > MAX_CONNECTIONS_PER_THREAD:
+            _, oldest = connections.popitem(last=False)
+            oldest.close()
+    return conn
+
+def close_connection(db_path):
+    """Close this thread's connection to the database"""
+    connections = getattr(_local, "connections", {})
+    conn = connections.pop(db_path, None)
+    if conn is not None:
+        conn.close()
+
+def _backfill_emotion_daily(conn):
+    """Populate emotion_daily from raw emotions for databases created before it existed"""
+    if conn.execute("SELECT 1 FROM emotion_daily LIMIT 1").fetchone() is not None:
+        return
+    with conn:
+        conn.execute(
+            "INSERT INTO emotion_daily (date, emotion, count) "
+            "SELECT date, emotion, COUNT(*) FROM emotions GROUP BY date, emotion"
+        )
+
+# Chat messages
+def count_messages(db_path):
+    """Number of stored chat messages"""
+    conn = get_connection(db_path)
+    return conn.execute("SELECT COUNT(*) FROM messages").fetchone()[0]
+
+def load_messages(db_path, limit=None):
+    """Load chat messages oldest first, optionally only the newest `limit`"""
+    return load_messages_window(db_path, limit)[1]
+
+def load_messages_window(db_path, limit=None):
+    """Load chat messages with the index (id - 1) of the first one
+
+    Returns (offset, messages).
+    """
+    conn = get_connection(db_path)
+    if limit is None:
+        rows = conn.execute("SELECT id, role, content FROM messages ORDER BY id").fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT id, role, content FROM (SELECT id, role, content FROM messages ORDER BY id DESC LIMIT ?) ORDER BY id",
+            (max(limit, 0),)
+        ).fetchall()
+
+    if rows:
+        offset = rows[0][0] - 1
+    else:
+        row = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'messages'").fetchone()
+        offset = row[0] if row else 0
+    return offset, [[role, content] for _, role, content in rows]
+
+def iter_messages(db_path, batch_size=500, start=0):
+    """Yield (index, role, content, timestamp) for every chat message from index start, oldest first"""
+    conn = get_connection(db_path)
+    cursor = conn.execute("SELECT id - 1, role, content, timestamp FROM messages WHERE id > ? ORDER BY id", (start,))
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        yield from rows
+
+def append_messages(db_path, messages, timestamps=None):
+    """Append chat messages in a single transaction
+
+    timestamps optionally gives an ISO timestamp per message.
+    """
+    conn = get_connection(db_path)
+    now = datetime.now().isoformat()
+    if not timestamps:
+        timestamps = [now] * len(messages)
+    with conn:
+        conn.executemany(
+            "INSERT INTO messages (role, content, timestamp) VALUES (?, ?, ?)",
+            [(role, message, timestamp or now) for (role, message), timestamp in zip(messages, timestamps)]
+        )
+
+def clear_messages(db_path):
+    """Delete all chat messages"""
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute("DELETE FROM messages")
+        conn.execute("DELETE FROM chat_daily")
+        conn.execute("DELETE FROM chat_summary")
+        conn.execute("DELETE FROM chat_log")
+        # Restart message indexes at 0, like a new JSON chat log
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'messages'")
+
+def load_history_id(db_path):
+    """Id of the current chat history, created on first use"""
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute("INSERT OR IGNORE INTO chat_log (id, history_id) VALUES (1, ?)", (uuid.uuid4().hex,))
+    return conn.execute("SELECT history_id FROM chat_log WHERE id = 1").fetchone()[0]
+
+def load_chat_summary(db_path):
+    """Rolling chat summary as {'summary': str, 'covered': int}"""
+    conn = get_connection(db_path)
+    row = conn.execute("SELECT summary, covered FROM chat_summary WHERE id = 1").fetchone()
+    if row is None:
+        return {'summary': "", 'covered': 0}
+    return {'summary': row[0], 'covered': row[1]}
+
+def save_chat_summary(db_path, summary, covered, history_id=None):
+    """Store the rolling chat summary
+
+    With history_id the summary is only stored while that is still the
+    current history's id. Returns whether it was stored.
+    """
+    conn = get_connection(db_path)
+    with conn:
+        # One statement, so a clear cannot slip in between the check and the write
+        cursor = conn.execute(
+            "INSERT INTO chat_summary (id, summary, covered) "
+            "SELECT 1, ?, ? WHERE ? IS NULL OR EXISTS (SELECT 1 FROM chat_log WHERE history_id = ?) "
+            "ON CONFLICT(id) DO UPDATE SET summary = excluded.summary, covered = excluded.covered",
+            (summary, covered, history_id, history_id)
+        )
+    return cursor.rowcount > 0
+
+def load_chat_daily_counts(db_path):
+    """Per-day counts of messages removed by retention
+
+    Returns {date: {role: count, f"{role}_chars": chars}}.
+    """
+    conn = get_connection(db_path)
+    days = {}
+    for date, role, count, chars in conn.execute("SELECT date, role, count, chars FROM chat_daily ORDER BY date"):
+        counts = days.setdefault(date, {})
+        counts[role] = count
+        counts[f"{role}_chars"] = chars
+    return days
+
+def add_chat_daily_counts(db_path, days):
+    """Add {date: {role: count, f"{role}_chars": chars}} to the per-day chat counts"""
+    rows = []
+    for date, counts in days.items():
+        for role, count in counts.items():
+            if not role.endswith("_chars"):
+                rows.append((date, role, count, counts.get(f"{role}_chars", 0)))
+    conn = get_connection(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO chat_daily (date, role, count, chars) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(date, role) DO UPDATE SET count = count + excluded.count, chars = chars + excluded.chars",
+            rows
+        )
+
+# Emotions
+def add_emotions(db_path, entries, update_rollups=True):
+    """Insert emotion entries in one transaction
+
+    Each entry is a dict with 'emotion' and ISO 'timestamp' and 'date' strings.
+    """
+    conn = get_connection(db_path)
+    rows = [(entry['emotion'], entry['timestamp'], entry['date']) for entry in entries]
+    with conn:
+        conn.executemany(
+            "INSERT INTO emotions (emotion, timestamp, date) VALUES (?, ?, ?)",
+            rows
+        )
+        if update_rollups:
+            conn.executemany(
+                "INSERT INTO emotion_daily (date, emotion, count) VALUES (?, ?, 1) "
+                "ON CONFLICT(date, emotion) DO UPDATE SET count = count + 1",
+                [(date, emotion) for emotion, _, date in rows]
+            )
+
+def load_emotions(db_path, since_date=None):
+    """Load emotion entries, optionally only those on or after an ISO date"""
+    conn = get_connection(db_path)
+    if since_date is None:
+        rows = conn.execute("SELECT emotion, timestamp, date FROM emotions ORDER BY id").fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT emotion, timestamp, date FROM emotions WHERE date >= ? ORDER BY id",
+            (since_date,)
+        ).fetchall()
+    return [
+        {'emotion': emotion, 'timestamp': timestamp, 'date': date}
+        for emotion, timestamp, date in rows
+    ]
+
+def add_daily_emotion_counts(db_path, days):
+    """Add {date: {emotion: count}} to the per-day counts"""
+    conn = get_connection(db_path)
+    with conn:
+        conn.executemany(
+            "INSERT INTO emotion_daily (date, emotion, count) VALUES (?, ?, ?) "
+            "ON CONFLICT(date, emotion) DO UPDATE SET count = count + excluded.count",
+            [(date, emotion, count) for date, counts in days.items() for emotion, count in counts.items()]
+        )
+
+def iter_emotions(db_path, batch_size=500):
+    """Yield every emotion entry as a dict, oldest first"""
+    conn = get_connection(db_path)
+    cursor = conn.execute("SELECT emotion, timestamp, date FROM emotions ORDER BY id")
+    while True:
+        rows = cursor.fetchmany(batch_size)
+        if not rows:
+            return
+        for emotion, timestamp, date in rows:
+            yield {'emotion': emotion, 'timestamp': timestamp, 'date': date}
+
+def load_daily_emotion_counts(db_path, since_date):
+    """Per-day emotion counts on or after an ISO date as {date: {emotion: count}}
+
+    Returns None when no emotion has ever been recorded.
+    """
+    conn = get_connection(db_path)
+    if conn.execute("SELECT 1 FROM emotion_daily LIMIT 1").fetchone() is None:
+        return None
+
+    days = {}
+    rows = conn.execute(
+        "SELECT date, emotion, count FROM emotion_daily WHERE date >= ? ORDER BY date",
+        (since_date,)
+    )
+    for date, emotion, count in rows:
+        days.setdefault(date, {})[emotion] = count
+    return days
+
+def clear_emotions(db_path):
+    """Delete all emotion entries"""
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute("DELETE FROM emotions")
+        conn.execute("DELETE FROM emotion_daily")
+
+# Preferences
+def save_preferences(db_path, preferences):
+    """Replace stored preferences with the given dict"""
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute("DELETE FROM preferences")
+        conn.executemany(
+            "INSERT INTO preferences (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value, ensure_ascii=False)) for key, value in preferences.items()]
+        )
+
+def load_preferences(db_path):
+    """Load stored preferences as a dict"""
+    conn = get_connection(db_path)
+    rows = conn.execute("SELECT key, value FROM preferences").fetchall()
+    return {key: json.loads(value) for key, value in rows}
+
+def clear_all(db_path):
+    """Delete all stored data"""
+    conn = get_connection(db_path)
+    with conn:
+        conn.execute("DELETE FROM messages")
+        conn.execute("DELETE FROM chat_daily")
+        conn.execute("DELETE FROM chat_summary")
+        conn.execute("DELETE FROM chat_log")
+        conn.execute("DELETE FROM sqlite_sequence WHERE name = 'messages'")
+        conn.execute("DELETE FROM emotions")
+        conn.execute("DELETE FROM emotion_daily")
+        conn.execute("DELETE FROM preferences")
+
+# Retention
+def apply_retention(db_path, chat_max_count=None, chat_keep_after=None, chat_rollups_keep_after=None,
+                    emotion_max_count=None, emotion_keep_after=None, emotion_rollups_keep_after=None):
+    """Delete rows outside the retention limits in one transaction
+
+    Chat messages are folded into chat_daily before deletion; emotion_daily
+    already counts every emotion. *_keep_after are ISO timestamps (raw rows)
+    or dates (rollups); None disables that limit. Returns the rows removed.
+    """
+    conn = get_connection(db_path)
+    with conn:
+        # Expired messages: older than the cutoff or beyond the newest chat_max_count
+        clauses, params = [], []
+        if chat_keep_after:
+            clauses.append("timestamp < ?")
+            params.append(chat_keep_after)
+        if chat_max_count is not None:
+            clauses.append("id <= (SELECT MAX(id) FROM messages) - ?")
+            params.append(chat_max_count)
+
+        chat_removed = 0
+        if clauses:
+            expired = " OR ".join(clauses)
+            conn.execute(
+                "INSERT INTO chat_daily (date, role, count, chars) "
+                f"SELECT substr(timestamp, 1, 10), role, COUNT(*), SUM(length(content)) FROM messages WHERE {expired} "
+                "GROUP BY substr(timestamp, 1, 10), role "
+                "ON CONFLICT(date, role) DO UPDATE SET count = count + excluded.count, chars = chars + excluded.chars",
+                params
+            )
+            chat_removed = conn.execute(f"DELETE FROM messages WHERE {expired}", params).rowcount
+
+        emotion_removed = 0
+        if emotion_keep_after:
+            emotion_removed += conn.execute(
+                "DELETE FROM emotions WHERE timestamp < ?", (emotion_keep_after,)
+            ).rowcount
+        if emotion_max_count is not None:
+            emotion_removed += conn.execute(
+                "DELETE FROM emotions WHERE id <= (SELECT MAX(id) FROM emotions) - ?",
+                (emotion_max_count,)
+            ).rowcount
+
+        if chat_rollups_keep_after:
+            conn.execute("DELETE FROM chat_daily WHERE date < ?", (chat_rollups_keep_after,))
+        if emotion_rollups_keep_after:
+            conn.execute("DELETE FROM emotion_daily WHERE date < ?", (emotion_rollups_keep_after,))
+
+    return {'chat_messages': chat_removed, 'emotions': emotion_removed}
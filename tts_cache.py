@@ -0,0 +1,153 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Synthesized speech shared by all sessions: the most recent clips in
+# memory, more on disk so they survive a restart (0 MB keeps them in memory only)
+MEMORY_ENTRIES = int(os.getenv("MIND_MIRROR_TTS_CACHE_MEMORY", 32))
+MAX_DISK_BYTES = int(float(os.getenv("MIND_MIRROR_TTS_CACHE_MB", 100)) * 1024 * 1024)
+CACHE_DIR = os.getenv("MIND_MIRROR_TTS_CACHE_DIR", os.path.join("data", "tts_cache"))
+
+# key -> (audio bytes, format), least recently used first
+_memory = OrderedDict()
+# key -> (size in bytes, format) of the clips on disk, least recently used first
+_disk = None
+_disk_bytes = 0
+_lock = threading.Lock()
+_stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+
+def make_key(text, language, voice=None, rate=None, volume=None):
+    """Cache key for a text spoken with the given voice settings"""
+    payload = [text.strip(), language, voice, rate, volume]
+    encoded = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha256(encoded).hexdigest()
+
+def _path(key, fmt):
+    return os.path.join(CACHE_DIR, f"{key}.{fmt}")
+
+def _load_disk_index():
+    # Called with _lock held; rebuilds the LRU order from modification times
+    global _disk, _disk_bytes
+    _disk = OrderedDict()
+    _disk_bytes = 0
+    if MAX_DISK_BYTES <= 0 or not os.path.isdir(CACHE_DIR):
+        return
+    files = []
+    for name in os.listdir(CACHE_DIR):
+        key, _, fmt = name.partition(".")
+        if not fmt or fmt.endswith("tmp"):
+            continue
+        stat = os.stat(os.path.join(CACHE_DIR, name))
+        files.append((stat.st_mtime, key, stat.st_size, fmt))
+    for _, key, size, fmt in sorted(files):
+        _disk[key] = (size, fmt)
+        _disk_bytes += size
+
+def _remember(key, data, fmt):
+    # Called with _lock held
+    if MEMORY_ENTRIES <= 0:
+        return
+    _memory[key] = (data, fmt)
+    _memory.move_to_end(key)
+    while len(_memory) > MEMORY_ENTRIES:
+        _memory.popitem(last=False)
+
+def get(key):
+    """Cached (audio bytes, format) for key, or None"""
+    with _lock:
+        entry = _memory.get(key)
+        if entry is not None:
+            _memory.move_to_end(key)
+            _stats["hits"] += 1
+            return entry
+
+        if _disk is None:
+            _load_disk_index()
+        if key in _disk:
+            _, fmt = _disk[key]
+            path = _path(key, fmt)
+            try:
+                with open(path, 'rb') as f:
+                    data = f.read()
+                # The modification time keeps the LRU order across restarts
+                os.utime(path)
+            except OSError:
+                _drop_disk(key)
+            else:
+                _disk.move_to_end(key)
+                _remember(key, data, fmt)
+                _stats["disk_hits"] += 1
+                return data, fmt
+
+        _stats["misses"] += 1
+        return None
+
+def put(key, data, fmt):
+    """Store a clip, evicting the least recently used ones beyond the size limits"""
+    global _disk_bytes
+    with _lock:
+        _remember(key, data, fmt)
+        if MAX_DISK_BYTES <= 0 or len(data) > MAX_DISK_BYTES:
+            return
+        if _disk is None:
+            _load_disk_index()
+        path = _path(key, fmt)
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning("Could not write speech cache file %s: %s", path, e)
+            return
+        if key in _disk:
+            _disk_bytes -= _disk[key][0]
+        _disk[key] = (len(data), fmt)
+        _disk.move_to_end(key)
+        _disk_bytes += len(data)
+        while _disk_bytes > MAX_DISK_BYTES:
+            _drop_disk(next(iter(_disk)))
+            _stats["evictions"] += 1
+
+def _drop_disk(key):
+    # Called with _lock held
+    global _disk_bytes
+    size, fmt = _disk.pop(key)
+    _disk_bytes -= size
+    try:
+        os.remove(_path(key, fmt))
+    except OSError:
+        pass
+
+def invalidate(key=None):
+    """Drop one clip (or everything when key is None) from memory and disk"""
+    with _lock:
+        if _disk is None:
+            _load_disk_index()
+        keys = list(_disk) if key is None else [key]
+        for cached in keys:
+            if cached in _disk:
+                _drop_disk(cached)
+        if key is None:
+            _memory.clear()
+        else:
+            _memory.pop(key, None)
+
+def cache_stats():
+    """Hit/miss counters and current size of the cache"""
+    with _lock:
+        if _disk is None:
+            _load_disk_index()
+        return dict(
+            _stats,
+            memory_entries=len(_memory),
+            disk_entries=len(_disk),
+            disk_mb=round(_disk_bytes / 1024 / 1024, 1),
+            max_disk_mb=round(MAX_DISK_BYTES / 1024 / 1024, 1)
+        )
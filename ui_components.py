@@ -120,6 +120,9 @@ def setup_sidebar():
         tts_enabled = st.checkbox("🔊 Voice Responses", value=st.session_state.tts_enabled)
         st.session_state.tts_enabled = tts_enabled
         
+        stream_replies = st.checkbox("⚡ Stream Responses", value=st.session_state.stream_replies)
+        st.session_state.stream_replies = stream_replies
+        
         # Emotion display
         if st.session_state.last_detected_emotion:
             st.info(f"Last emotion: {st.session_state.last_detected_emotion}")
@@ -42,7 +42,7 @@ def display_voice_features():
             st.success(f"Recognized: {test_input}")
     
     if st.button("🔊 Test Voice Output"):
-        speak_text("Hello! This is a test of the voice output system. How does this sound?")
+        speak_text("Hello! This is a test of the voice output system. How does this sound?", wait=True)
         st.success("Voice test completed!")
     
     st.markdown("#### Voice Settings")
@@ -55,4 +55,4 @@ def clear_emotion_history():
     # This would need to be implemented in chat_memory.py
     # For now, it's just a placeholder
     if "emotion_history" in st.session_state:
-        st.session_state.emotion_history = []
\ No newline at end of file
+        del st.session_state["emotion_history"]
\ No newline at end of file
@@ -1,31 +1,97 @@
 import streamlit as st
-import speech_recognition as sr
-import pyttsx3
 import tempfile
 import os
 import io
-from pydub import AudioSegment
-from pydub.playback import play
 import threading
 import time
 import queue
-import numpy as np
 from datetime import datetime
 import re
+import json
+import uuid
+import logging
+import importlib.util
+from concurrent.futures import ThreadPoolExecutor
+from emotion_series import EmotionSeries
+from config import RETENTION_POLICIES
+from audio_worker import AudioWorker
+import tts_cache
+
+# Audio libraries (speech_recognition, pyttsx3, gtts, pydub) are imported
+# inside the functions that use them so that importing this module, which
+# every page does, stays cheap when voice mode is off.
+
+logger = logging.getLogger(__name__)
+
+# Seconds between checks for recognized speech while the microphone is on
+VOICE_POLL_INTERVAL = 0.5
+
+# Seconds a session may go without checking for speech before its tab is
+# taken as closed: its microphone capture is stopped and its unread
+# results are dropped. Must outlast the slowest reply (MIND_MIRROR_REPLY_SLA).
+VOICE_IDLE_TIMEOUT = float(os.getenv("MIND_MIRROR_VOICE_IDLE_TIMEOUT", 60))
+
+# Confidence (0-1) at which a transcript in the chosen language is used
+# without waiting for recognition in the other language
+RECOGNITION_CONFIDENCE = float(os.getenv("MIND_MIRROR_RECOGNITION_CONFIDENCE", 0.8))
+
+# Speech recognition engine per language: "google" (online) or "vosk"
+# (offline, CPU). Override with e.g.
+# MIND_MIRROR_RECOGNIZERS='{"en-IN": "vosk"}'
+RECOGNIZER_ENGINES = {"ta-IN": "google", "en-IN": "google"}
+RECOGNIZER_ENGINES.update(json.loads(os.getenv("MIND_MIRROR_RECOGNIZERS", "{}")))
+
+# Vosk model directory per language, e.g.
+# MIND_MIRROR_VOSK_MODELS='{"en-IN": "models/vosk-model-small-en-in-0.4"}'
+VOSK_MODEL_PATHS = json.loads(os.getenv("MIND_MIRROR_VOSK_MODELS", "{}"))
+
+# Runs the recognition requests for both languages side by side
+_recognition_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="recognition")
+
+# Phrases of the voice output test, synthesized ahead of time with the fallback replies
+VOICE_TEST_TEXTS = {
+    "English": "Hello! This is a test of the English voice system.",
+    "Tamil": "வணக்கம்! இது தமிழ் குரல் அமைப்பின் சோதனை."
+}
+
+# Voice settings per detected emotion; other emotions use 'neutral'
+EMOTION_VOICE_PROFILES = {
+    'happy': {'rate': 180, 'volume': 0.9},
+    'sad': {'rate': 120, 'volume': 0.7},
+    'angry': {'rate': 160, 'volume': 0.8},
+    'anxious': {'rate': 140, 'volume': 0.6},
+    'neutral': {'rate': 150, 'volume': 0.8},
+}
 
 # Initialize global variables
-recognizer = sr.Recognizer()
-tts_engine = None
+recognizer = None
+tts_engine = None  # created and used only on the speech worker thread
+_tts_voice = None
+_tts_error = None
+_active_profile = None
 audio_queue = queue.Queue()
 
-def initialize_tts():
-    """Initialize text-to-speech engine with Tamil support"""
-    global tts_engine
+def get_recognizer():
+    """Get the shared speech recognizer, creating it on first use"""
+    global recognizer
+    if recognizer is None:
+        import speech_recognition as sr
+        recognizer = sr.Recognizer()
+    return recognizer
+
+def _create_tts_engine():
+    """Create the pyttsx3 engine and pick a voice; raises if TTS is unavailable
+
+    Runs once, on the speech worker thread, which is the only thread that
+    uses the engine afterwards.
+    """
+    global tts_engine, _tts_voice, _tts_error
     try:
-        tts_engine = pyttsx3.init()
+        import pyttsx3
+        engine = pyttsx3.init()
         
         # Get available voices
-        voices = tts_engine.getProperty('voices')
+        voices = engine.getProperty('voices')
         
         # Try to find Tamil or Indian English voice
         tamil_voice = None
@@ -41,19 +107,47 @@ def initialize_tts():
         
         # Set voice preference: Tamil > Indian English > Default
         if tamil_voice:
-            tts_engine.setProperty('voice', tamil_voice)
+            engine.setProperty('voice', tamil_voice)
         elif indian_voice:
-            tts_engine.setProperty('voice', indian_voice)
-        
-        # Set speech rate and volume
-        tts_engine.setProperty('rate', 150)  # Slower for better understanding
-        tts_engine.setProperty('volume', 0.8)
-        
-        return True
+            engine.setProperty('voice', indian_voice)
         
+        _tts_voice = engine.getProperty('voice')
+        tts_engine = engine
+        _use_voice_profile(_voice_profile(None))
     except Exception as e:
-        st.error(f"TTS initialization failed: {e}")
+        _tts_error = e
+        raise
+
+def _voice_profile(emotion):
+    """Voice settings for a detected emotion"""
+    return EMOTION_VOICE_PROFILES.get(emotion) or EMOTION_VOICE_PROFILES['neutral']
+
+def _use_voice_profile(profile):
+    """Switch the engine to a voice profile unless it is already in use"""
+    global _active_profile
+    if profile is not _active_profile:
+        tts_engine.setProperty('rate', profile['rate'])
+        tts_engine.setProperty('volume', profile['volume'])
+        _active_profile = profile
+
+def _require_tts_engine():
+    if tts_engine is None:
+        raise RuntimeError(f"Text-to-speech not available: {_tts_error or 'engine not started'}")
+
+def start_speech_service():
+    """Start the speech worker, which creates the TTS engine on its own thread"""
+    speech_worker.start()
+
+def initialize_tts(timeout=10):
+    """Initialize text-to-speech engine with Tamil support"""
+    start_speech_service()
+    if not speech_worker.ready.wait(timeout):
+        st.error("TTS initialization is taking too long")
+        return False
+    if tts_engine is None:
+        st.error(f"TTS initialization failed: {_tts_error}")
         return False
+    return True
 
 def detect_language(text):
     """Simple language detection for Tamil vs English"""
@@ -65,15 +159,188 @@ def detect_language(text):
     else:
         return 'english'
 
+def _configure_recognizer(recognizer):
+    """Recognizer settings shared by blocking and background capture"""
+    recognizer.energy_threshold = 4000
+    recognizer.dynamic_energy_threshold = True
+    recognizer.pause_threshold = 1.0
+
+class RecognizerBackend:
+    """A speech-to-text engine used by recognize_audio
+
+    recognize(audio, language_code) returns the most likely transcript and
+    its confidence (0-1), or (None, 0.0) if nothing was understood. It
+    raises sr.RequestError when the engine cannot be used. One instance
+    serves every session, from several threads at once.
+    """
+
+    name = None
+
+    def recognize(self, audio, language_code):
+        raise NotImplementedError
+
+    def preload(self, language_code):
+        """Get ready to recognize language_code, e.g. by loading its model"""
+
+class GoogleRecognizer(RecognizerBackend):
+    """Google Web Speech API, one network round trip per phrase"""
+
+    name = "google"
+
+    def recognize(self, audio, language_code):
+        import speech_recognition as sr
+
+        try:
+            result = get_recognizer().recognize_google(audio, language=language_code, show_all=True)
+        except sr.UnknownValueError:
+            return None, 0.0
+        alternatives = result.get("alternative") if isinstance(result, dict) else None
+        if not alternatives:
+            return None, 0.0
+        # The most likely alternative comes first and is the only one scored;
+        # an unscored transcript ranks below any scored one
+        best = alternatives[0]
+        return best.get("transcript") or None, best.get("confidence", 0.0)
+
+class VoskRecognizer(RecognizerBackend):
+    """Offline recognition on the CPU with Vosk (Kaldi) models
+
+    Each language's model is loaded the first time it is needed and then
+    shared by all sessions; only the light per-phrase recognizer is
+    created for every call.
+    """
+
+    name = "vosk"
+    SAMPLE_RATE = 16000
+
+    def __init__(self, model_paths):
+        self.model_paths = model_paths
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def _model(self, language_code):
+        import speech_recognition as sr
+
+        with self._lock:
+            if language_code not in self._models:
+                path = self.model_paths.get(language_code)
+                if not path:
+                    raise sr.RequestError(f"No Vosk model configured for {language_code}")
+                try:
+                    from vosk import Model, SetLogLevel
+                    SetLogLevel(-1)
+                    self._models[language_code] = Model(path)
+                except Exception as e:
+                    raise sr.RequestError(f"Could not load Vosk model {path}: {e}")
+                logger.info("Loaded Vosk model for %s from %s", language_code, path)
+            return self._models[language_code]
+
+    def preload(self, language_code):
+        self._model(language_code)
+
+    def recognize(self, audio, language_code):
+        import speech_recognition as sr
+
+        model = self._model(language_code)
+        try:
+            from vosk import KaldiRecognizer
+        except ImportError as e:
+            raise sr.RequestError(f"Vosk is not installed: {e}")
+
+        recognizer = KaldiRecognizer(model, self.SAMPLE_RATE)
+        recognizer.SetWords(True)
+        recognizer.AcceptWaveform(audio.get_raw_data(convert_rate=self.SAMPLE_RATE, convert_width=2))
+        result = json.loads(recognizer.FinalResult())
+        text = result.get("text", "").strip()
+        if not text:
+            return None, 0.0
+        # Vosk scores each word; the phrase gets their mean
+        words = result.get("result") or []
+        confidence = sum(word.get("conf", 0.0) for word in words) / len(words) if words else 0.0
+        return text, confidence
+
+_recognizer_backends = {
+    "google": GoogleRecognizer(),
+    "vosk": VoskRecognizer(VOSK_MODEL_PATHS),
+}
+
+def get_recognizer_backend(language_code):
+    """The engine configured for language_code in RECOGNIZER_ENGINES"""
+    name = RECOGNIZER_ENGINES.get(language_code, "google")
+    if name not in _recognizer_backends:
+        logger.warning("Unknown speech recognizer %r for %s, using google", name, language_code)
+        name = "google"
+    return _recognizer_backends[name]
+
+def preload_recognizers(language_codes=("ta-IN", "en-IN")):
+    """Load the offline models for these languages ahead of the first phrase"""
+    for language_code in language_codes:
+        try:
+            get_recognizer_backend(language_code).preload(language_code)
+        except Exception as e:
+            logger.warning("Could not preload the %s recognizer: %s", language_code, e)
+
+def _recognize_best(audio, language_code):
+    """Most likely transcript in one language and its confidence, or (None, 0.0)"""
+    return get_recognizer_backend(language_code).recognize(audio, language_code)
+
+def _other_language(language_code):
+    return "en-IN" if language_code == "ta-IN" else "ta-IN"
+
+def recognize_audio(audio, language_code):
+    """
+    Recognize recorded audio in the chosen language and the other one at once
+
+    Both requests run in parallel. A primary transcript with confidence of
+    at least RECOGNITION_CONFIDENCE is returned without waiting for the
+    other language; otherwise the more confident transcript wins, the
+    primary language on a tie.
+
+    Each language uses the engine chosen for it in RECOGNIZER_ENGINES.
+    Returns (text, language code used), or (None, None) if the speech
+    could not be understood. Raises sr.RequestError when both requests fail.
+    """
+    import speech_recognition as sr
+
+    alt_lang = _other_language(language_code)
+    primary = _recognition_executor.submit(_recognize_best, audio, language_code)
+    alternate = _recognition_executor.submit(_recognize_best, audio, alt_lang)
+
+    candidates = []
+    errors = []
+    for future, code, priority in ((primary, language_code, 1), (alternate, alt_lang, 0)):
+        try:
+            text, confidence = future.result()
+        except sr.RequestError as e:
+            errors.append(e)
+            continue
+        if not text:
+            continue
+        if future is primary and confidence >= RECOGNITION_CONFIDENCE:
+            # The other request finishes in the background and is ignored
+            return text, code
+        candidates.append((confidence, priority, text, code))
+
+    if candidates:
+        _, _, text, code = max(candidates)
+        return text, code
+    if errors:
+        raise errors[0]
+    return None, None
+
 def get_voice_input_with_emotion(language_code="ta-IN", timeout=10):
     """
     Enhanced voice input with emotion detection and Tamil support
+
+    Blocks until one phrase is recorded and recognized; the chat, journal
+    and mood pages use the background capture of record_voice_input instead.
     """
     try:
+        import speech_recognition as sr
+        recognizer = get_recognizer()
+        
         # Initialize recognizer with better settings
-        recognizer.energy_threshold = 4000
-        recognizer.dynamic_energy_threshold = True
-        recognizer.pause_threshold = 1.0
+        _configure_recognizer(recognizer)
         
         with sr.Microphone() as source:
             st.info("🎤 Listening... Please speak now!")
@@ -90,16 +357,14 @@ def get_voice_input_with_emotion(language_code="ta-IN", timeout=10):
                 audio = recognizer.listen(source, timeout=timeout, phrase_time_limit=15)
                 status_placeholder.info("🔄 Processing...")
                 
-                # Try Google Speech Recognition first
                 try:
-                    text = recognizer.recognize_google(
-                        audio, 
-                        language=language_code,
-                        show_all=False
-                    )
+                    text, used_language = recognize_audio(audio, language_code)
                     
                     if text:
-                        status_placeholder.success(f"✅ Recognized: {text}")
+                        if used_language == language_code:
+                            status_placeholder.success(f"✅ Recognized: {text}")
+                        else:
+                            status_placeholder.success(f"✅ Recognized ({used_language}): {text}")
                         
                         # Detect emotion from voice (simplified)
                         emotion = detect_emotion_from_text(text)
@@ -111,18 +376,6 @@ def get_voice_input_with_emotion(language_code="ta-IN", timeout=10):
                         st.session_state.last_detected_emotion = emotion
                         
                         return text, emotion
-                    
-                except sr.UnknownValueError:
-                    # Try with alternative language if primary fails
-                    alt_lang = "en-IN" if language_code == "ta-IN" else "ta-IN"
-                    try:
-                        text = recognizer.recognize_google(audio, language=alt_lang)
-                        if text:
-                            status_placeholder.success(f"✅ Recognized ({alt_lang}): {text}")
-                            emotion = detect_emotion_from_text(text)
-                            return text, emotion
-                    except:
-                        pass
                 
                 except sr.RequestError as e:
                     status_placeholder.error(f"❌ Speech recognition error: {e}")
@@ -173,56 +426,178 @@ def detect_emotion_from_text(text):
     
     return 'neutral'
 
-from gtts import gTTS
-
-def speak_text(text, emotion=None, language=None):
+def _decode_clip(data, fmt):
     """
-    Speak text using gTTS for Tamil and pyttsx3 for English
+    Decode an audio clip in memory to (pcm bytes, channels, sample width, rate)
+
+    miniaudio decodes inside the process; without it pydub pipes the
+    bytes through an ffmpeg process. Nothing is written to disk.
     """
-    global tts_engine
+    try:
+        import miniaudio
+    except ImportError:
+        miniaudio = None
+
+    if miniaudio is not None:
+        decoded = miniaudio.decode(data, output_format=miniaudio.SampleFormat.SIGNED16)
+        return decoded.samples.tobytes(), decoded.nchannels, 2, decoded.sample_rate
+
+    from pydub import AudioSegment
+    audio = AudioSegment.from_file(io.BytesIO(data), format=fmt)
+    return audio.raw_data, audio.channels, audio.sample_width, audio.frame_rate
 
-    if not language:
-        language = detect_language(text)
+def _can_play_clips():
+    """Whether synthesized clips can be decoded and played"""
+    has = lambda name: importlib.util.find_spec(name) is not None
+    return has("pydub") or (has("miniaudio") and has("simpleaudio"))
 
+def _play_pcm(pcm, channels, sample_width, frame_rate, cancel):
+    """Play raw PCM audio, stopping early once cancel is set"""
+    try:
+        import simpleaudio
+    except ImportError:
+        simpleaudio = None
+
+    if simpleaudio is None:
+        # ffplay/pyaudio playback cannot be interrupted
+        from pydub import AudioSegment
+        from pydub.playback import play
+        play(AudioSegment(data=pcm, sample_width=sample_width, frame_rate=frame_rate, channels=channels))
+        return
+
+    playback = simpleaudio.play_buffer(pcm, channels, sample_width, frame_rate)
+    try:
+        while playback.is_playing():
+            if cancel.wait(0.05):
+                break
+    finally:
+        playback.stop()
+
+def _synthesize_tamil(text):
+    """Tamil speech from gTTS as (mp3 bytes, "mp3")"""
+    from gtts import gTTS
+
+    buffer = io.BytesIO()
+    gTTS(text=text, lang='ta').write_to_fp(buffer)
+    return buffer.getvalue(), "mp3"
+
+def _synthesize_english(text):
+    """English speech from pyttsx3 with its current settings, as (wav bytes, "wav")"""
+    fd, path = tempfile.mkstemp(suffix=".wav")
+    os.close(fd)
+    try:
+        tts_engine.save_to_file(text, path)
+        tts_engine.runAndWait()
+        with open(path, 'rb') as f:
+            data = f.read()
+    finally:
+        os.remove(path)
+    if not data:
+        raise RuntimeError("The speech engine produced no audio")
+    return data, "wav"
+
+def _speech_clip(text, emotion, language):
+    """Synthesized (audio bytes, format) for text, from the cache when it was spoken before"""
     if language == 'tamil':
-        try:
-            tts = gTTS(text=text, lang='ta')
-            with tempfile.NamedTemporaryFile(delete=True, suffix=".mp3") as fp:
-                tts.save(fp.name)
-                audio = AudioSegment.from_mp3(fp.name)
-                play(audio)
-        except Exception as e:
-            st.error(f"🔇 Tamil speech error: {e}")
+        key = tts_cache.make_key(text, language, 'gtts-ta')
+        synthesize = _synthesize_tamil
     else:
-        # English voice using pyttsx3
-        if not tts_engine:
-            if not initialize_tts():
-                st.error("Text-to-speech not available")
-                return
+        # The key comes from the profile, so a cache hit never touches the engine
+        profile = _voice_profile(emotion)
+        key = tts_cache.make_key(text, language, _tts_voice, profile['rate'], profile['volume'])
 
-        try:
-            # Adjust voice properties based on emotion
-            if emotion:
-                if emotion == 'happy':
-                    tts_engine.setProperty('rate', 180)
-                    tts_engine.setProperty('volume', 0.9)
-                elif emotion == 'sad':
-                    tts_engine.setProperty('rate', 120)
-                    tts_engine.setProperty('volume', 0.7)
-                elif emotion == 'angry':
-                    tts_engine.setProperty('rate', 160)
-                    tts_engine.setProperty('volume', 0.8)
-                elif emotion == 'anxious':
-                    tts_engine.setProperty('rate', 140)
-                    tts_engine.setProperty('volume', 0.6)
-                else:
-                    tts_engine.setProperty('rate', 150)
-                    tts_engine.setProperty('volume', 0.8)
-
-            tts_engine.say(text)
-            tts_engine.runAndWait()
-        except Exception as e:
-            st.error(f"🔇 English speech error: {e}")
+        def synthesize(text):
+            _require_tts_engine()
+            _use_voice_profile(profile)
+            return _synthesize_english(text)
+
+    clip = tts_cache.get(key)
+    if clip is None:
+        clip = synthesize(text)
+        tts_cache.put(key, *clip)
+    return clip
+
+def _speak_live(job):
+    """Speak English straight through pyttsx3, for when clips cannot be played"""
+    _require_tts_engine()
+    _use_voice_profile(_voice_profile(job.emotion))
+
+    def stop_if_cancelled(name, location, length):
+        if job.cancel.is_set():
+            tts_engine.stop()
+
+    # The engine calls back before each word, which is where it can be stopped
+    token = tts_engine.connect('started-word', stop_if_cancelled)
+    try:
+        tts_engine.say(job.text)
+        tts_engine.runAndWait()
+    finally:
+        tts_engine.disconnect(token)
+
+def _speak_job(job):
+    """Synthesize and play one speech job; runs on the audio worker thread"""
+    language = job.language or detect_language(job.text)
+
+    if language != 'tamil' and not _can_play_clips():
+        if job.play:
+            _speak_live(job)
+        return
+
+    clip = _speech_clip(job.text, job.emotion, language)
+    if job.play and not job.cancel.is_set():
+        _play_pcm(*_decode_clip(*clip), job.cancel)
+
+# The one thread that synthesizes and plays speech for every session
+speech_worker = AudioWorker(_speak_job, name="speech", setup_func=_create_tts_engine)
+
+# Emotions the fixed phrases are synthesized for by prewarm_speech
+PREWARM_EMOTIONS = list(EMOTION_VOICE_PROFILES)
+_speech_prewarmed = False
+_prewarm_lock = threading.Lock()
+
+def speak_text(text, emotion=None, language=None, owner=None, wait=False):
+    """
+    Speak text using gTTS for Tamil and pyttsx3 for English
+
+    Speech is played by the background audio worker, so this returns at
+    once unless wait is set. A new text from the same owner interrupts the
+    one still playing. owner defaults to the current browser session.
+    Returns the speech job.
+    """
+    if owner is None:
+        owner = audio_owner()
+    job = speech_worker.submit(text, emotion, language, owner)
+    if wait:
+        job.finished.wait()
+        if job.state == "failed":
+            st.error(f"🔇 Speech error: {job.error}")
+    return job
+
+def prewarm_speech():
+    """Synthesize the fixed phrases in the background so they play at once"""
+    global _speech_prewarmed
+    start_speech_service()
+    with _prewarm_lock:
+        if _speech_prewarmed:
+            return
+        _speech_prewarmed = True
+
+    from ai_responses import FALLBACK_RESPONSES, ERROR_RESPONSE
+
+    for text in FALLBACK_RESPONSES + [ERROR_RESPONSE]:
+        # Fallback replies are spoken with the user's last emotion
+        for emotion in PREWARM_EMOTIONS:
+            speech_worker.submit(text, emotion, 'english', owner="prewarm", replace=False, play=False)
+    for text in VOICE_TEST_TEXTS.values():
+        speech_worker.submit(text, owner="prewarm", replace=False, play=False)
+
+def speech_status(owner=None):
+    """What the audio worker is doing for owner, see AudioWorker.status"""
+    return speech_worker.status(owner if owner is not None else audio_owner())
+
+def stop_speech(owner=None):
+    """Stop the owner's speech and drop whatever is still queued"""
+    return speech_worker.cancel(owner if owner is not None else audio_owner())
 
 def create_audio_controls():
     """
@@ -244,22 +619,251 @@ def create_audio_controls():
     
     return None
 
+class VoiceCapture:
+    """Records from the microphone in the background and recognizes each
+    phrase on a separate thread
+
+    listen_in_background puts every phrase on audio_queue as soon as it
+    ends, so the next phrase is recorded while the previous one is still
+    being recognized. There is one microphone, so one session (owner) at a
+    time can listen; results are kept per owner until the script polls them.
+    An owner that has not called start, status or poll for
+    VOICE_IDLE_TIMEOUT seconds loses the microphone and its results.
+    """
+
+    def __init__(self, audio_queue):
+        self.audio_queue = audio_queue
+        self._lock = threading.Lock()
+        self._owner = None
+        self._language_code = None
+        self._state = "idle"  # idle, calibrating or listening
+        self._stop_listening = None
+        self._pending = {}  # owner -> phrases waiting for recognition
+        self._results = {}  # owner -> recognized phrases not yet polled
+        self._last_seen = {}  # owner -> time.monotonic() of its last call
+        self._worker = None
+
+    def start(self, language_code, owner):
+        """Start listening for owner; returns False if another session has the microphone"""
+        with self._lock:
+            self._last_seen[owner] = time.monotonic()
+            # Frees the microphone if a closed tab still holds it
+            stop_abandoned = self._expire_idle()
+            if self._state != "idle":
+                if self._owner != owner:
+                    return False
+                self._language_code = language_code
+                return True
+            self._owner = owner
+            self._language_code = language_code
+            self._state = "calibrating"
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._recognize_loop, name="voice-recognition", daemon=True)
+                self._worker.start()
+        if stop_abandoned is not None:
+            stop_abandoned(wait_for_stop=False)
+        # Offline models load while the microphone calibrates
+        _recognition_executor.submit(preload_recognizers, (language_code, _other_language(language_code)))
+        # Ambient noise calibration takes a second, so it runs off the script thread too
+        threading.Thread(target=self._open_microphone, args=(owner,), name="voice-capture", daemon=True).start()
+        return True
+
+    def stop(self, owner):
+        """Stop listening; phrases already recorded are still recognized"""
+        with self._lock:
+            if self._owner != owner:
+                return
+            stop_listening = self._release()
+        if stop_listening is not None:
+            stop_listening(wait_for_stop=False)
+
+    def status(self, owner):
+        """Capture state for owner: idle, calibrating, listening or busy (another session listens)"""
+        with self._lock:
+            self._last_seen[owner] = time.monotonic()
+            stop_abandoned = self._expire_idle()
+            if self._state == "idle" or self._owner == owner:
+                state = self._state
+            else:
+                state = "busy"
+            status = {
+                "state": state,
+                "pending": self._pending.get(owner, 0),
+                "results": len(self._results.get(owner, ()))
+            }
+        if stop_abandoned is not None:
+            stop_abandoned(wait_for_stop=False)
+        return status
+
+    def poll(self, owner):
+        """Take the owner's recognized phrases, oldest first"""
+        with self._lock:
+            self._last_seen[owner] = time.monotonic()
+            return self._results.pop(owner, [])
+
+    def _release(self):
+        # Called with self._lock held; returns the listener's stop function
+        stop_listening = self._stop_listening
+        self._owner = None
+        self._state = "idle"
+        self._stop_listening = None
+        return stop_listening
+
+    def _expire_idle(self):
+        # Called with self._lock held. Forgets owners idle for longer than
+        # VOICE_IDLE_TIMEOUT and returns the stop function of the listener
+        # one of them still held, for the caller to call once unlocked
+        stop_listening = None
+        cutoff = time.monotonic() - VOICE_IDLE_TIMEOUT
+        for owner, last_seen in list(self._last_seen.items()):
+            if last_seen >= cutoff:
+                continue
+            if owner == self._owner:
+                logger.info("Stopping the voice capture of a session that stopped polling")
+                stop_listening = self._release()
+            del self._last_seen[owner]
+            self._results.pop(owner, None)
+        return stop_listening
+
+    def _add_result(self, owner, **result):
+        # Called with self._lock held
+        if owner not in self._last_seen:
+            # The owner was expired; nobody would ever poll this
+            return
+        result.setdefault("text", None)
+        result.setdefault("language_code", None)
+        result.setdefault("error", None)
+        result["timestamp"] = datetime.now()
+        self._results.setdefault(owner, []).append(result)
+
+    def _open_microphone(self, owner):
+        try:
+            import speech_recognition as sr
+            recognizer = get_recognizer()
+            _configure_recognizer(recognizer)
+            microphone = sr.Microphone()
+            with microphone as source:
+                recognizer.adjust_for_ambient_noise(source, duration=1)
+            stop_listening = recognizer.listen_in_background(microphone, self._on_phrase, phrase_time_limit=15)
+        except Exception as e:
+            logger.warning("Microphone capture failed: %s", e)
+            with self._lock:
+                if self._owner == owner:
+                    self._owner = None
+                    self._state = "idle"
+                self._add_result(owner, error=f"Voice input error: {e}")
+            return
+
+        with self._lock:
+            if self._owner == owner and self._state == "calibrating":
+                self._stop_listening = stop_listening
+                self._state = "listening"
+                return
+        # Stopped while calibrating
+        stop_listening(wait_for_stop=False)
+
+    def _on_phrase(self, recognizer, audio):
+        # Runs on the listener thread once a phrase has ended
+        if speech_worker.busy():
+            # Most likely the app's own voice coming out of the speakers
+            return
+        with self._lock:
+            stop_abandoned = self._expire_idle()
+            owner, language_code = self._owner, self._language_code
+            if owner is not None:
+                self._pending[owner] = self._pending.get(owner, 0) + 1
+        if stop_abandoned is not None:
+            stop_abandoned(wait_for_stop=False)
+        if owner is not None:
+            self.audio_queue.put((owner, language_code, audio))
+
+    def _recognize_loop(self):
+        while True:
+            owner, language_code, audio = self.audio_queue.get()
+            try:
+                text, used_language = recognize_audio(audio, language_code)
+                result = {"text": text, "language_code": used_language} if text else None
+            except Exception as e:
+                result = {"error": f"Speech recognition error: {e}"}
+            with self._lock:
+                self._pending[owner] -= 1
+                if not self._pending[owner]:
+                    del self._pending[owner]
+                # Phrases that could not be understood are dropped
+                if result is not None:
+                    self._add_result(owner, **result)
+
+voice_capture = VoiceCapture(audio_queue)
+
+def audio_owner():
+    """Key identifying this browser session to the audio workers"""
+    if "audio_owner" not in st.session_state:
+        st.session_state.audio_owner = uuid.uuid4().hex
+    return st.session_state.audio_owner
+
+@st.fragment(run_every=VOICE_POLL_INTERVAL)
+def _watch_voice_capture(owner):
+    # Reruns the whole page once a phrase has been recognized
+    status = voice_capture.status(owner)
+    if status["results"]:
+        st.rerun()
+    if status["state"] == "calibrating":
+        st.info("🎤 Adjusting to background noise...")
+    elif status["state"] == "listening":
+        st.info("🔴 Listening... Please speak now!")
+    if status["pending"]:
+        st.caption("🔄 Processing...")
+
 def record_voice_input(language_code=None):
+    """
+    Voice input from the background microphone capture
+
+    Returns the text recognized since the last run, or None. While the
+    microphone is on, the page checks for new phrases every
+    VOICE_POLL_INTERVAL seconds without blocking the script.
+    """
     if not language_code:
         language_code = st.session_state.get("language_code", "en-IN")    
     
-    if st.button("🎤 Click to Record Voice"):
-        with st.spinner("🎙️ Recording... Speak now!"):
-            text, emotion = get_voice_input_with_emotion(language_code)
-            
-            if text:
-                st.success(f"✅ Recognized: {text}")
-                if emotion and emotion != 'neutral':
-                    st.info(f"😊 Detected emotion: {emotion}")
-                return text
+    owner = audio_owner()
+    status = voice_capture.status(owner)
+    
+    if status["state"] in ("idle", "busy"):
+        if st.button("🎤 Click to Record Voice"):
+            if voice_capture.start(language_code, owner):
+                status = voice_capture.status(owner)
             else:
-                st.error("❌ Could not recognize speech. Please try again.")
-                return None
+                st.warning("🎙️ The microphone is being used in another session.")
+    else:
+        # Follow language changes made in the sidebar
+        voice_capture.start(language_code, owner)
+    
+    if status["state"] in ("calibrating", "listening"):
+        if st.button("⏹️ Stop Recording"):
+            voice_capture.stop(owner)
+            st.rerun()
+    
+    texts = []
+    for result in voice_capture.poll(owner):
+        if result["error"]:
+            st.error(f"❌ {result['error']}")
+            continue
+        texts.append(result["text"])
+        emotion = detect_emotion_from_text(result["text"])
+        save_emotion_data(emotion, result["timestamp"])
+        st.session_state.last_detected_emotion = emotion
+    
+    # Poll after taking the results, or the fragment would rerun the page at once
+    if status["state"] in ("calibrating", "listening") or status["pending"]:
+        _watch_voice_capture(owner)
+    
+    if texts:
+        text = " ".join(texts)
+        st.success(f"✅ Recognized: {text}")
+        emotion = st.session_state.last_detected_emotion
+        if emotion and emotion != 'neutral':
+            st.info(f"😊 Detected emotion: {emotion}")
+        return text
     
     return None
 
@@ -267,45 +871,36 @@ def save_emotion_data(emotion, timestamp):
     """
     Save emotion data to session state and file
     """
-    if "emotion_history" not in st.session_state:
-        st.session_state.emotion_history = []
+    # Stored column-wise (epoch seconds + emotion code) rather than as dicts
+    if not isinstance(st.session_state.get("emotion_history"), EmotionSeries):
+        st.session_state.emotion_history = EmotionSeries()
     
-    emotion_entry = {
-        "emotion": emotion,
-        "timestamp": timestamp,
-        "date": timestamp.date()
-    }
-    
-    st.session_state.emotion_history.append(emotion_entry)
+    st.session_state.emotion_history.append(emotion, timestamp)
     
-    # Keep only last 100 entries to manage memory
-    if len(st.session_state.emotion_history) > 100:
-        st.session_state.emotion_history = st.session_state.emotion_history[-100:]
+    # Keep only the newest entries to manage memory
+    max_count = RETENTION_POLICIES["session_emotions"].get("max_count")
+    if max_count is not None and len(st.session_state.emotion_history) > max_count:
+        st.session_state.emotion_history = st.session_state.emotion_history.tail(max_count)
 
 def get_emotion_summary(days=7):
     """
     Get emotion summary for specified number of days
     """
-    if "emotion_history" not in st.session_state:
+    history = st.session_state.get("emotion_history")
+    if not isinstance(history, EmotionSeries) or not len(history):
         return {"message": "No emotion data available"}
     
     from datetime import datetime, timedelta
     
     # Filter last N days
     cutoff_date = datetime.now().date() - timedelta(days=days)
-    recent_emotions = [
-        entry for entry in st.session_state.emotion_history 
-        if entry["date"] >= cutoff_date
-    ]
+    recent_emotions = history.between(datetime.combine(cutoff_date, datetime.min.time()))
     
-    if not recent_emotions:
+    if not len(recent_emotions):
         return {"message": f"No emotion data from last {days} days"}
     
     # Calculate statistics
-    emotion_counts = {}
-    for entry in recent_emotions:
-        emotion = entry["emotion"]
-        emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+    emotion_counts = recent_emotions.counts()
     
     total = len(recent_emotions)
     most_common = max(emotion_counts, key=emotion_counts.get)
@@ -344,25 +939,26 @@ def test_voice_output():
     """Test voice output functionality"""
     st.write("### 🔊 Voice Output Test")
     
-    test_texts = {
-        "English": "Hello! This is a test of the English voice system.",
-        "Tamil": "வணக்கம்! இது தமிழ் குரல் அமைப்பின் சோதனை."
-    }
-    
-    for lang, text in test_texts.items():
+    for lang, text in VOICE_TEST_TEXTS.items():
         if st.button(f"Test {lang} Voice"):
-            speak_text(text)
+            speak_text(text, wait=True)
             st.success(f"{lang} voice test completed!")
 
 # Export main functions for use in main app
 __all__ = [
     'get_voice_input_with_emotion',
     'speak_text',
+    'speech_status',
+    'stop_speech',
+    'prewarm_speech',
     'create_audio_controls',
     'record_voice_input',
+    'recognize_audio',
+    'preload_recognizers',
     'save_emotion_data',
     'get_emotion_summary',
     'initialize_tts',
+    'start_speech_service',
     'test_voice_recognition',
     'test_voice_output'
 ]
\ No newline at end of file
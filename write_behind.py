@@ -0,0 +1,129 @@
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+class RetryItems(Exception):
+    """Raised by a flush_func that wrote part of a batch; only items are retried"""
+
+    def __init__(self, items):
+        super().__init__(f"{len(items)} item(s) failed to write")
+        self.items = list(items)
+
+class WriteBehindQueue:
+    """Collects items from any thread and hands them to flush_func in batches
+    on a background thread, at most every flush_interval seconds or as soon
+    as max_batch items are waiting.
+
+    flush_func(items) is never called concurrently, and items reach it in
+    submission order. Pending items are flushed at interpreter exit.
+
+    When flush_func raises, the batch (or the items of a RetryItems) goes
+    back to the front of the queue and the next flush waits with an
+    exponential backoff, however many items are waiting. Items that have
+    failed max_attempts times are dropped.
+    """
+
+    def __init__(self, flush_func, flush_interval=2.0, max_batch=50, name="write-behind",
+                 max_attempts=5, max_retry_delay=60.0):
+        self.flush_func = flush_func
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.name = name
+        self.max_attempts = max_attempts
+        self.max_retry_delay = max(max_retry_delay, flush_interval)
+        self._pending = []  # (item, failed attempts) in submission order
+        self._failures = 0  # failed flushes in a row
+        self._cond = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+    def submit(self, item):
+        """Queue an item for the next flush and return immediately"""
+        with self._cond:
+            self._pending.append((item, 0))
+            self._ensure_started()
+            if len(self._pending) >= self.max_batch:
+                self._cond.notify()
+
+    def flush(self):
+        """Write out everything queued so far on the calling thread"""
+        with self._flush_lock:
+            with self._cond:
+                batch, self._pending = self._pending, []
+            if batch:
+                self._write(batch)
+
+    def discard(self, predicate=None):
+        """Drop queued items (those matching predicate, or all) that have not been written yet"""
+        with self._flush_lock:
+            with self._cond:
+                if predicate is None:
+                    self._pending = []
+                else:
+                    self._pending = [entry for entry in self._pending if not predicate(entry[0])]
+
+    def pending_count(self):
+        """Number of items waiting to be written"""
+        with self._cond:
+            return len(self._pending)
+
+    def close(self):
+        """Stop the background thread after a final flush"""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def _ensure_started(self):
+        # Called with self._cond held
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def _retry_delay(self):
+        # Called with self._cond held
+        return min(self.flush_interval * 2 ** (self._failures - 1), self.max_retry_delay)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if self._failures:
+                    # Back off after a failed flush; a full queue does not cut this short
+                    retry_at = time.monotonic() + self._retry_delay()
+                    while not self._stopped and time.monotonic() < retry_at:
+                        self._cond.wait(retry_at - time.monotonic())
+                elif not self._stopped and len(self._pending) < self.max_batch:
+                    self._cond.wait(self.flush_interval)
+                stopped = self._stopped
+            self.flush()
+            if stopped:
+                return
+
+    def _write(self, batch):
+        try:
+            self.flush_func([item for item, _ in batch])
+        except Exception as e:
+            if isinstance(e, RetryItems):
+                # flush_func has already reported what went wrong
+                failed_items = {id(item) for item in e.items}
+                failed = [(item, attempts) for item, attempts in batch if id(item) in failed_items]
+            else:
+                failed = batch
+                logger.exception("%s: failed to write %d item(s)", self.name, len(failed))
+            retry = [(item, attempts + 1) for item, attempts in failed if attempts + 1 < self.max_attempts]
+            if len(retry) < len(failed):
+                logger.error("%s: dropping %d item(s) after %d failed attempts",
+                             self.name, len(failed) - len(retry), self.max_attempts)
+            with self._cond:
+                self._failures += 1
+                self._pending[:0] = retry
+        else:
+            with self._cond:
+                self._failures = 0